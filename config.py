@@ -20,6 +20,8 @@ START_FEN   = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 EP_TEST_FEN = "8/2p5/8/K2Pr3/8/8/8/8 b - c6 0 1"
 PIECE_SET = 'pieces-1/'
 
+PONDER = True  # engine keeps thinking on the player's time
+
 SIDEBAR_WIDTH = SCREEN_WIDTH - (BOARD_SIZE * SQUARE_SIZE) - BOARD_ORIGIN_X * 2  # Remaining space
 
 COLOR_PALETTES = {
@@ -1,13 +1,41 @@
-from engine.evaluation import evaluate
-from collections import Counter
+from engine.evaluation import evaluate, compute_psqt, PSQT
+import struct
 from engine.move import Move
+from engine.bitboards import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, LIGHT_SQUARES,
+                              bishop_attacks, rook_attacks)
 import engine.constants as C
 import engine.MoveGen as MoveGen
 
+# squares, turn, castling, en passant, halfmove clock, fullmove number
+PACK_FORMAT = struct.Struct('64b b B b B H')
+
+class UndoRecord:
+    # state needed to take back one move, one reusable record per ply
+    __slots__ = ('move', 'captured', 'castling', 'en_passant', 'halfmove', 'zobrist', 'psqt_score', 'null_ply')
+
+    def __init__(self):
+        self.move       = 0
+        self.captured   = C.EMPTY
+        self.castling   = 0
+        self.en_passant = -1
+        self.halfmove   = 0
+        self.zobrist    = 0
+        self.psqt_score = 0
+        self.null_ply   = 0 # only set by null moves
+
 class Board:
+    # verify the incremental key against compute_zobrist after every make/unmake
+    debug_zobrist = False
+
     def __init__(self):
         self.squares = [0] * 64
 
+        # one bitboard per signed piece, indexed by the piece itself so that
+        # bitboards[C.W_KNIGHT] and bitboards[C.B_KNIGHT] (index -2) both work
+        self.bitboards = [0] * 13
+        # occupancy[1] = white, occupancy[-1] = black, occupancy[0] = both
+        self.occupancy = [0] * 3
+
         self.turn = 1           # -1 for black
         self.castling = C.CASTLE_ALL
         self.en_passant = -1
@@ -17,47 +45,66 @@ class Board:
         self.white_king_pos = C.WHITE_KING_START
         self.black_king_pos = C.BLACK_KING_START
 
-        self.history = []
+        # undo records are reused across plies, undo_stack[ply] belongs to the move made at ply
+        self.undo_stack = [UndoRecord() for _ in range(C.MAX_PLY)]
+        self.ply = 0
 
-        self.repetitions = Counter()
-        self.zobrist_key = self.compute_zobrist()
-        self.repetitions[self.zobrist_key] += 1
+        # zobrist key of the position at each ply, scanned for repetitions
+        self.key_history = [0] * (C.MAX_PLY + 1)
+        # ply right after the last null move; repetition scans stop there, a
+        # position from before the null move isn't really repeated
+        self.null_ply = 0
+        self.sync_from_squares()
 
     def generate_legal_moves(self):
-        legal_moves = []
-        
-        for move in self.generate_pseudo_legal_moves():
-            self.make_move(move, update_hash=False)
-            if not self.is_in_check(-self.turn):
-                legal_moves.append(move)
-            self.unmake_move(update_hash=False)
-        
-        return legal_moves
+        return MoveGen.generate_legal_moves(self)
+
+    def generate_captures(self):
+        # legal captures, en passant and promotions
+        return MoveGen.generate_legal_moves(self, quiets=False)
+
+    def generate_quiet_moves(self):
+        # legal non-capturing, non-promoting moves including castling
+        return MoveGen.generate_legal_moves(self, captures=False)
+
+    def is_legal_move(self, move):
+        return MoveGen.is_legal_move(self, move)
 
     def generate_pseudo_legal_moves(self):
         moves = []
 
-        for square in range(64):
-            piece = self.squares[square]
-            if piece * self.turn <= 0:
-                continue # not our piece
-            
-            piece_type = abs(piece)
-            if piece_type == 1: # pawn
-                moves.extend(MoveGen.generate_pawn_moves(self, square))
-            elif piece_type == 2: # knight
-                moves.extend(MoveGen.generate_knight_moves(self, square))
-            elif piece_type == 3: # bishop
-                moves.extend(MoveGen.generate_bishop_moves(self, square))
-            elif piece_type == 4: # rook
-                moves.extend(MoveGen.generate_rook_moves(self, square))
-            elif piece_type == 5: # queen
-                moves.extend(MoveGen.generate_queen_moves(self, square))
-            elif piece_type == 6: # king
-                moves.extend(MoveGen.generate_king_moves(self, square))
+        MoveGen.generate_pawn_moves(self, moves)
+        MoveGen.generate_knight_moves(self, moves)
+        MoveGen.generate_bishop_moves(self, moves)
+        MoveGen.generate_rook_moves(self, moves)
+        MoveGen.generate_queen_moves(self, moves)
+        MoveGen.generate_king_moves(self, moves)
 
         return moves
 
+    def sync_from_squares(self):
+        # rebuild every derived structure after self.squares was edited by hand
+        bitboards = [0] * 13
+        occupancy = [0] * 3
+
+        for square, piece in enumerate(self.squares):
+            if piece != C.EMPTY:
+                bitboards[piece] |= 1 << square
+                occupancy[1 if piece > 0 else -1] |= 1 << square
+        occupancy[0] = occupancy[1] | occupancy[-1]
+
+        self.bitboards = bitboards
+        self.occupancy = occupancy
+
+        if bitboards[C.W_KING]:
+            self.white_king_pos = bitboards[C.W_KING].bit_length() - 1
+        if bitboards[C.B_KING]:
+            self.black_king_pos = bitboards[C.B_KING].bit_length() - 1
+
+        self.zobrist_key = self.compute_zobrist()
+        self.key_history[self.ply] = self.zobrist_key
+        self.psqt_score = compute_psqt(self)
+
     def compute_zobrist(self):
         key = 0
         for square, piece in enumerate(self.squares):
@@ -72,195 +119,284 @@ class Board:
 
         return key
 
-    def make_move(self, move, update_hash=True):
+    def make_move(self, move):
         from_sq =  move & 0x3F
         to_sq   = (move >> 6) & 0x3F
         flags   = (move >> 12) & 0xF
 
-        self.history.append({
-            'move': move,
-            'captured': self.squares[to_sq],
-            'castling': self.castling,
-            'en_passant': self.en_passant,
-            'halfmove': self.halfmove,
-            'flags': flags
-        })
-
-        piece = self.squares[from_sq]
-        self.squares[from_sq] = C.EMPTY
-        # en passant
-        if flags == C.EN_PASSANT:
-            if self.turn == 1:
-                captured_sq = to_sq + C.DOWN
+        squares   = self.squares
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        zobrist_piece = C.ZOBRIST_PIECE
+        us = self.turn
+
+        piece    = squares[from_sq]
+        captured = squares[to_sq]
+
+        # reuse this ply's undo record
+        if self.ply == len(self.undo_stack):
+            self.undo_stack.append(UndoRecord())
+        record = self.undo_stack[self.ply]
+        self.ply += 1
+
+        record.move       = move
+        record.castling   = self.castling
+        record.en_passant = self.en_passant
+        record.halfmove   = self.halfmove
+        record.zobrist    = key = self.zobrist_key
+        record.psqt_score = psqt_score = self.psqt_score
+
+        key ^= C.ZOBRIST_TURN
+
+        # the old ep file is only part of the key if we could have captured on it
+        if self.en_passant != -1:
+            if PAWN_ATTACKS[-us][self.en_passant] & bitboards[C.PAWN * us]:
+                key ^= C.ZOBRIST_ENPASSANT[self.en_passant & 7]
+            self.en_passant = -1
+
+        from_bb = 1 << from_sq
+        to_bb   = 1 << to_sq
+        move_bb = from_bb | to_bb
+
+        if not flags and not captured:
+            # quiet move: no capture, promotion, castling or en passant
+            squares[from_sq] = C.EMPTY
+            squares[to_sq] = piece
+            bitboards[piece] ^= move_bb
+            occupancy[us] ^= move_bb
+            occupancy[0] ^= move_bb
+            key ^= zobrist_piece[piece][from_sq] ^ zobrist_piece[piece][to_sq]
+            psqt_score += PSQT[piece][to_sq] - PSQT[piece][from_sq]
+            record.captured = C.EMPTY
+
+            if piece * us == C.PAWN:
+                self.halfmove = 0
+                if to_sq - from_sq in (16, -16): # pawn moved 2 squares
+                    self.en_passant = (from_sq + to_sq) >> 1
+                    # hashed only if an enemy pawn can actually take it
+                    if PAWN_ATTACKS[us][self.en_passant] & bitboards[-C.PAWN * us]:
+                        key ^= C.ZOBRIST_ENPASSANT[self.en_passant & 7]
             else:
-                captured_sq = to_sq + C.UP
-
-            self.history[-1]['captured'] = self.squares[captured_sq]
-            self.squares[captured_sq] = C.EMPTY
-            self.squares[to_sq] = piece
-
-
-        # promotion
-        if flags in (C.PROMOTION_QUEEN, C.PROMOTION_QUEEN_CAPTURE):
-            self.squares[to_sq] = C.W_QUEEN if self.turn == 1 else C.B_QUEEN
-            
-        elif flags in (C.PROMOTION_ROOK, C.PROMOTION_ROOK_CAPTURE):
-            self.squares[to_sq] = C.W_ROOK if self.turn == 1 else C.B_ROOK
-            
-        elif flags in (C.PROMOTION_BISHOP, C.PROMOTION_BISHOP_CAPTURE):
-            self.squares[to_sq] = C.W_BISHOP if self.turn == 1 else C.B_BISHOP
-            
-        elif flags in (C.PROMOTION_KNIGHT, C.PROMOTION_KNIGHT_CAPTURE):
-            self.squares[to_sq] = C.W_KNIGHT if self.turn == 1 else C.B_KNIGHT
-        else:
-            self.squares[to_sq] = piece
+                self.halfmove += 1
 
-        # en passant target update
-        self.en_passant = -1
-        if abs(piece) == 1 and abs(to_sq - from_sq) == 16: # pawn moved 2 squares
-            self.en_passant = (from_sq + to_sq) // 2
-
-        if flags == C.CASTLING:
-            if piece == C.W_KING:
-                if to_sq == C.WHITE_KINGSIDE_CASTLE:     # white castling kingside
-                    self.squares[C.WHITE_ROOK_H1] = C.EMPTY
-                    self.squares[C.WHITE_ROOK_F1] = C.W_ROOK
-                elif to_sq == C.WHITE_QUEENSIDE_CASTLE: # white castling queenside
-                    self.squares[C.WHITE_ROOK_A1] = C.EMPTY
-                    self.squares[C.WHITE_ROOK_D1] = C.W_ROOK
-            
-                self.white_king_pos = to_sq
-                self.castling &= ~(C.CASTLE_WK | C.CASTLE_WQ) # clear white castling rights
-            
-            elif piece == C.B_KING:
-                if to_sq == C.BLACK_KINGSIDE_CASTLE:    # black castling kingside
-                    self.squares[C.BLACK_ROOK_H8] = C.EMPTY
-                    self.squares[C.BLACK_ROOK_F8] = C.B_ROOK
-                elif to_sq == C.BLACK_QUEENSIDE_CASTLE: # black castling queenside
-                    self.squares[C.BLACK_ROOK_A8] = C.EMPTY
-                    self.squares[C.BLACK_ROOK_D8] = C.B_ROOK
-                
-                self.black_king_pos = to_sq
-                self.castling &= ~(C.CASTLE_BK | C.CASTLE_BQ) # clear black castling rights
-        
-        # halfmove clock update
-        if abs(piece) == 1 or flags & C.CAPTURE:
-            self.halfmove = 0
         else:
-            self.halfmove += 1
+            # lift the moving piece
+            squares[from_sq] = C.EMPTY
+            bitboards[piece] ^= from_bb
+            occupancy[us] ^= move_bb
+            key ^= zobrist_piece[piece][from_sq]
+            psqt_score -= PSQT[piece][from_sq]
+
+            if flags == C.EN_PASSANT:
+                captured_sq = to_sq + (C.DOWN if us == 1 else C.UP)
+                captured = squares[captured_sq]
+                squares[captured_sq] = C.EMPTY
+                bitboards[captured] ^= 1 << captured_sq
+                occupancy[-us] ^= 1 << captured_sq
+                key ^= zobrist_piece[captured][captured_sq]
+                psqt_score -= PSQT[captured][captured_sq]
+
+            elif captured != C.EMPTY:
+                bitboards[captured] ^= to_bb
+                occupancy[-us] ^= to_bb
+                key ^= zobrist_piece[captured][to_sq]
+                psqt_score -= PSQT[captured][to_sq]
+
+            record.captured = captured
+
+            # promotion
+            if flags & C.PROMOTION:
+                placed = C.PROMOTION_PIECES[flags & 0b11] * us
+            else:
+                placed = piece
+
+            squares[to_sq] = placed
+            bitboards[placed] ^= to_bb
+            key ^= zobrist_piece[placed][to_sq]
+            psqt_score += PSQT[placed][to_sq]
+
+            if flags == C.CASTLING:
+                rook_from, rook_to = C.CASTLING_ROOK_SQUARES[to_sq]
+                rook = squares[rook_from]
+                squares[rook_from] = C.EMPTY
+                squares[rook_to] = rook
+                rook_bb = (1 << rook_from) | (1 << rook_to)
+                bitboards[rook] ^= rook_bb
+                occupancy[us] ^= rook_bb
+                key ^= zobrist_piece[rook][rook_from] ^ zobrist_piece[rook][rook_to]
+                psqt_score += PSQT[rook][rook_to] - PSQT[rook][rook_from]
+
+            occupancy[0] = occupancy[1] | occupancy[-1]
+
+            # halfmove clock update
+            if piece * us == C.PAWN or captured != C.EMPTY:
+                self.halfmove = 0
+            else:
+                self.halfmove += 1
+
+        # castling rights are lost when a king or rook leaves, or a rook is taken on its home square
+        castling = self.castling
+        if castling:
+            new_castling = castling & C.CASTLING_RIGHTS_MASK[from_sq] & C.CASTLING_RIGHTS_MASK[to_sq]
+            if new_castling != castling:
+                key ^= C.ZOBRIST_CASTLING[castling] ^ C.ZOBRIST_CASTLING[new_castling]
+                self.castling = new_castling
 
-        # update castling rights
-        self._update_castling_rights(from_sq, to_sq, piece, self.history[-1]['captured'])
+        if piece == C.W_KING:
+            self.white_king_pos = to_sq
+        elif piece == C.B_KING:
+            self.black_king_pos = to_sq
 
         # flip turn
-        self.turn *= -1
-        if self.turn == 1:
+        self.turn = -us
+        if us == -1:
             self.fullmove += 1
-        
-        if update_hash:
-            self.zobrist_key = self.compute_zobrist()
-            self.repetitions[self.zobrist_key] += 1
 
-    def unmake_move(self, update_hash=True):
+        self.zobrist_key = key
+        self.psqt_score = psqt_score
+        if self.debug_zobrist:
+            assert key == self.compute_zobrist(), f"zobrist drift after {Move.move_to_string(move)}"
+
+        if self.ply == len(self.key_history):
+            self.key_history.append(key)
+        else:
+            self.key_history[self.ply] = key
+
+    def unmake_move(self):
         # undo most recent move
-        state = self.history.pop()
-        move = state['move']
+        self.ply -= 1
+        record = self.undo_stack[self.ply]
+        move = record.move
 
-        from_sq = move & 0x3F
+        from_sq =  move & 0x3F
         to_sq   = (move >> 6) & 0x3F
-        flags   = state['flags']
+        flags   = (move >> 12) & 0xF
+
+        squares   = self.squares
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        us = -self.turn # side that made the move
 
-        # default
-        piece = self.squares[to_sq]
+        captured = record.captured
+        piece = squares[to_sq]
 
-        # undo promotion
-        if flags in (C.PROMOTION_QUEEN, C.PROMOTION_QUEEN_CAPTURE, C.PROMOTION_ROOK, 
-                     C.PROMOTION_ROOK_CAPTURE, C.PROMOTION_BISHOP, C.PROMOTION_BISHOP_CAPTURE, 
-                     C.PROMOTION_KNIGHT, C.PROMOTION_KNIGHT_CAPTURE):
+        if not flags and not captured:
+            # quiet move
+            move_bb = (1 << from_sq) | (1 << to_sq)
+            squares[to_sq] = C.EMPTY
+            squares[from_sq] = piece
+            bitboards[piece] ^= move_bb
+            occupancy[us] ^= move_bb
+            occupancy[0] ^= move_bb
 
-            pawn = C.W_PAWN if self.turn == -1 else C.B_PAWN
-            self.squares[from_sq] = pawn
-            
         else:
-            self.squares[from_sq] = piece
-
-        if flags == C.CASTLING:
-            self.squares[from_sq] = C.W_KING if self.turn == -1 else C.B_KING
-            if to_sq == C.WHITE_KINGSIDE_CASTLE:  # white king-side
-                self.squares[C.WHITE_ROOK_H1] = C.W_ROOK
-                self.squares[C.WHITE_ROOK_F1] = C.EMPTY
-
-            elif to_sq == C.WHITE_QUEENSIDE_CASTLE:  # white queen-side
-                self.squares[C.WHITE_ROOK_A1] = C.W_ROOK
-                self.squares[C.WHITE_ROOK_D1] = C.EMPTY
-
-            elif to_sq == C.BLACK_KINGSIDE_CASTLE:   # black king-side
-                self.squares[C.BLACK_ROOK_H8] = C.B_ROOK
-                self.squares[C.BLACK_ROOK_F8] = C.EMPTY
-
-            elif to_sq == C.BLACK_QUEENSIDE_CASTLE:   # black queen-side
-                self.squares[C.BLACK_ROOK_A8] = C.B_ROOK
-                self.squares[C.BLACK_ROOK_D8] = C.EMPTY
-
-        # undo en passant capture
-        if flags == C.EN_PASSANT:
-            self.squares[from_sq] = C.W_PAWN if self.turn == -1 else C.B_PAWN
-            if self.turn == -1: # white move was just undone
-                captured_sq = to_sq + C.DOWN
-                self.squares[captured_sq] = C.B_PAWN
-            else:               # black move was just undone
-                captured_sq = to_sq + C.UP
-                self.squares[captured_sq] = C.W_PAWN
-
-        # replace captured piece (or empty square)
-        self.squares[to_sq] = state['captured']
+            from_bb = 1 << from_sq
+            to_bb   = 1 << to_sq
+
+            # undo promotion
+            placed = piece
+            if flags & C.PROMOTION:
+                piece = C.PAWN * us
+
+            bitboards[placed] ^= to_bb
+            bitboards[piece] ^= from_bb
+            squares[from_sq] = piece
+            occupancy[us] ^= from_bb | to_bb
+
+            # replace captured piece (or empty square)
+            if flags == C.EN_PASSANT:
+                captured_sq = to_sq + (C.DOWN if us == 1 else C.UP)
+                squares[to_sq] = C.EMPTY
+                squares[captured_sq] = captured
+                bitboards[captured] ^= 1 << captured_sq
+                occupancy[-us] ^= 1 << captured_sq
+            else:
+                squares[to_sq] = captured
+                if captured != C.EMPTY:
+                    bitboards[captured] ^= to_bb
+                    occupancy[-us] ^= to_bb
+
+            if flags == C.CASTLING:
+                rook_from, rook_to = C.CASTLING_ROOK_SQUARES[to_sq]
+                rook = squares[rook_to]
+                squares[rook_to] = C.EMPTY
+                squares[rook_from] = rook
+                rook_bb = (1 << rook_from) | (1 << rook_to)
+                bitboards[rook] ^= rook_bb
+                occupancy[us] ^= rook_bb
+
+            occupancy[0] = occupancy[1] | occupancy[-1]
 
         # restore game state
-        self.castling = state['castling']
-        self.en_passant = state['en_passant']
-        self.halfmove = state['halfmove']
+        self.castling   = record.castling
+        self.en_passant = record.en_passant
+        self.halfmove   = record.halfmove
 
         # restore king positions
-        if piece == C.W_KING or flags == C.CASTLING:
+        if piece == C.W_KING:
             self.white_king_pos = from_sq
-        elif piece == C.B_KING or flags == C.CASTLING:
+        elif piece == C.B_KING:
             self.black_king_pos = from_sq
-        
-        # flip turn 
-        self.turn *= -1
-        if self.turn == -1:
+
+        # flip turn
+        self.turn = us
+        if us == -1:
             self.fullmove -= 1
 
-        if update_hash:
-            self.zobrist_key = self.compute_zobrist()
-            self.repetitions[self.zobrist_key] -= 1
+        self.zobrist_key = record.zobrist
+        self.psqt_score = record.psqt_score
+        if self.debug_zobrist:
+            assert self.zobrist_key == self.compute_zobrist(), "zobrist drift on unmake"
+
+    def make_null_move(self):
+        # pass the turn without moving, for null-move pruning
+        if self.ply == len(self.undo_stack):
+            self.undo_stack.append(UndoRecord())
+        record = self.undo_stack[self.ply]
+        self.ply += 1
+
+        record.move       = 0
+        record.captured   = C.EMPTY
+        record.castling   = self.castling
+        record.en_passant = self.en_passant
+        record.halfmove   = self.halfmove
+        record.zobrist    = key = self.zobrist_key
+        record.psqt_score = self.psqt_score
+        record.null_ply   = self.null_ply
+
+        key ^= C.ZOBRIST_TURN
+        if self.en_passant != -1:
+            if self.enpassant_available():
+                key ^= C.ZOBRIST_ENPASSANT[self.en_passant & 7]
+            self.en_passant = -1
+
+        self.null_ply = self.ply
+        self.turn = -self.turn
+        self.zobrist_key = key
+        if self.debug_zobrist:
+            assert key == self.compute_zobrist(), "zobrist drift after null move"
+
+        if self.ply == len(self.key_history):
+            self.key_history.append(key)
+        else:
+            self.key_history[self.ply] = key
+
+    def unmake_null_move(self):
+        self.ply -= 1
+        record = self.undo_stack[self.ply]
 
-        # assert self.compute_zobrist() == self.zobrist_key
+        self.en_passant  = record.en_passant
+        self.null_ply    = record.null_ply
+        self.turn        = -self.turn
+        self.zobrist_key = record.zobrist
 
     def enpassant_available(self):
         if self.en_passant == -1:
             return False
 
-        ep_rank = self.en_passant // 8
-        ep_file = self.en_passant  % 8
-
-        if self.turn == 1:
-            for df in (1, -1):
-                adj_file = ep_file + df
-                if 0 <= adj_file < 8:
-                    square = (ep_rank + 1) * 8 + adj_file
-                    if self.squares[square] == C.W_PAWN:
-                        return True
-
-        else:
-            for df in (1, -1):
-                adj_file = ep_file + df
-                if 0 <= adj_file < 8:
-                    square = (ep_rank - 1) * 8 + adj_file
-                    if self.squares[square] == C.B_PAWN:
-                        return True
-
-        return False
+        # a pawn of the side to move sits where an enemy pawn on the ep square would attack
+        pawns = self.bitboards[C.PAWN * self.turn]
+        return bool(PAWN_ATTACKS[-self.turn][self.en_passant] & pawns)
 
     def evaluate(self):
         return evaluate(self)
@@ -276,7 +412,15 @@ class Board:
         return 0 <= square < 64
     
     def has_legal_moves(self):
-        return len(self.generate_legal_moves()) > 0
+        # one piece type at a time, stopping at the first that can move; the
+        # king goes first since one of its moves is usually legal
+        bitboards = self.bitboards
+        us = self.turn
+        for piece_type in (C.KING, C.PAWN, C.KNIGHT, C.BISHOP, C.ROOK, C.QUEEN):
+            pieces = bitboards[piece_type * us]
+            if pieces and MoveGen.generate_legal_moves(self, from_mask=pieces):
+                return True
+        return False
     
     def is_checkmate(self):
         return self.is_in_check(self.turn) and not self.has_legal_moves()
@@ -284,8 +428,35 @@ class Board:
     def is_stalemate(self):
         return not self.is_in_check(self.turn) and not self.has_legal_moves()
 
+    def repetition_count(self, limit=2):
+        """How many times the current position occurred before, counting
+        up to limit. Only the last halfmove plies since the last null move
+        can hold a repeat and the side to move must match, so every other
+        ply is skipped."""
+        key = self.zobrist_key
+        key_history = self.key_history
+        count = 0
+        for ply in range(self.ply - 4, max(self.ply - self.halfmove, self.null_ply) - 1, -2):
+            if key_history[ply] == key:
+                count += 1
+                if count == limit:
+                    break
+        return count
+
+    def is_repetition(self):
+        # enough to score a draw inside the search tree
+        return self.repetition_count(1) > 0
+
     def is_threefold_repetition(self):
-        return self.repetitions[self.zobrist_key] >= 3
+        return self.repetition_count(2) >= 2
+
+    def is_draw_by_rule(self):
+        # draws that need no move generation
+        return (
+            self.halfmove >= 100 or
+            self.is_threefold_repetition() or
+            self.is_insufficient_material()
+        )
 
     def is_draw(self):
         return (
@@ -295,8 +466,17 @@ class Board:
             self.is_insufficient_material()
         )
 
+    def status(self):
+        """ONGOING, CHECKMATE, STALEMATE or DRAW in one pass: the rule draws
+        first, then move generation only until the first legal move"""
+        if self.is_draw_by_rule():
+            return C.DRAW
+        if self.has_legal_moves():
+            return C.ONGOING
+        return C.CHECKMATE if self.is_in_check(self.turn) else C.STALEMATE
+
     def is_terminal(self):
-        return self.is_checkmate() or self.is_draw()
+        return self.status() != C.ONGOING
 
     def count_pseudo_moves_for_side(self, side):
         old = self.turn
@@ -327,149 +507,90 @@ class Board:
             self.squares[j] = C.W_PAWN
 
         self.castling = C.CASTLE_ALL
-        self.zobrist_key = self.compute_zobrist()
-        self.repetitions[self.zobrist_key] += 1
+        self.sync_from_squares()
+
+    def pack(self):
+        """Compact bytes of the position (no game history), see Board.unpack"""
+        return PACK_FORMAT.pack(*self.squares, self.turn, self.castling, self.en_passant,
+                                min(self.halfmove, 255), self.fullmove)
+
+    @classmethod
+    def unpack(cls, data):
+        board = cls()
+        fields = PACK_FORMAT.unpack(data)
+        board.squares = list(fields[:64])
+        board.turn, board.castling, board.en_passant, board.halfmove, board.fullmove = fields[64:]
+        board.sync_from_squares()
+        return board
 
     def move_to_string(self, move):
         return Move.move_to_string(move)
 
-    def _update_castling_rights(self, from_sq, to_sq, piece, captured):
-        # clear castling if king moves
-        if piece == C.W_KING:
-            self.castling &= ~(C.CASTLE_WK | C.CASTLE_WQ)
-            self.white_king_pos = to_sq
-        elif piece == C.B_KING:
-            self.castling &= ~(C.CASTLE_BK | C.CASTLE_BQ)
-            self.black_king_pos = to_sq
-
-        # if rook moves
-        if from_sq == C.WHITE_ROOK_H1:      # white rook h1
-            self.castling &= ~C.CASTLE_WK
-        elif from_sq == C.WHITE_ROOK_A1:    # white rook a1
-            self.castling &= ~C.CASTLE_WQ
-        elif from_sq == C.BLACK_ROOK_H8:    # black rook h8
-            self.castling &= ~C.CASTLE_BK
-        elif from_sq == C.BLACK_ROOK_A8:    # black rook a8
-            self.castling &= ~C.CASTLE_BQ
-
-        # if rook captured
-        if captured == C.W_ROOK:
-            if to_sq == C.WHITE_ROOK_H1: self.castling &= ~C.CASTLE_WK
-            if to_sq == C.WHITE_ROOK_A1: self.castling &= ~C.CASTLE_WQ
-        elif captured == C.B_ROOK:
-            if to_sq == C.BLACK_ROOK_H8: self.castling &= ~C.CASTLE_BK
-            if to_sq == C.BLACK_ROOK_A8: self.castling &= ~C.CASTLE_BQ
-
     def _is_square_attacked(self, square, attacking_color):
-        sq_rank = square // 8
-        sq_file = square % 8
-
-        pawn_file = (square % 8)  # file of the square being attacked
-
-        # Pawns
-        if attacking_color == 1:  # white pawns
-            for offset in (C.DOWN_LEFT, C.DOWN_RIGHT):
-                target = square + offset
-                if self.is_valid_square(target):
-                    tr, tf = target // 8, target % 8
-                    # ensure diagonal: file difference must be 1
-                    if abs(tf - (square % 8)) == 1 and self.squares[target] == C.W_PAWN:
-                        return True
-        else:  # black pawns
-            for offset in (C.UP_LEFT, C.UP_RIGHT):
-                target = square + offset
-                if self.is_valid_square(target):
-                    tr, tf = target // 8, target % 8
-                    if abs(tf - (square % 8)) == 1 and self.squares[target] == C.B_PAWN:
-                        return True
+        bitboards = self.bitboards
+        color = attacking_color
 
-        
-        # Knights
-        for offset in C.KNIGHT_DIRS:
-            target = square + offset
-            if not self.is_valid_square(target):
-                continue
-            tr, tf = target // 8, target % 8
-            if abs(tr - sq_rank) <= 2 and abs(tf - sq_file) <= 2:
-                piece = self.squares[target]
-                if attacking_color == 1 and piece == C.W_KNIGHT:
-                    return True
-                if attacking_color == -1 and piece == C.B_KNIGHT:
-                    return True
+        # a pawn of the attacking side sits where one of ours on `square` would attack
+        if PAWN_ATTACKS[-color][square] & bitboards[C.PAWN * color]:
+            return True
+        if KNIGHT_ATTACKS[square] & bitboards[C.KNIGHT * color]:
+            return True
+        if KING_ATTACKS[square] & bitboards[C.KING * color]:
+            return True
 
-        # Bishops / Queens (diagonals)
-        for direction in C.BISHOP_DIRS:
-            current = square + direction
-            while self.is_valid_square(current):
-                # prevent wrap: ensure we didn’t jump across the board horizontally
-                if abs((current % 8) - ((current - direction) % 8)) != 1:
-                    break
+        occupied = self.occupancy[0]
+        queens = bitboards[C.QUEEN * color]
 
-                piece = self.squares[current]
-                if piece != C.EMPTY:
-                    if attacking_color == 1 and piece in (C.W_BISHOP, C.W_QUEEN):
-                        return True
-                    if attacking_color == -1 and piece in (C.B_BISHOP, C.B_QUEEN):
-                        return True
-                    break
-                current += direction
+        # Bishops / Queens (diagonals)
+        if bishop_attacks(square, occupied) & (bitboards[C.BISHOP * color] | queens):
+            return True
 
         # Rooks / Queens (orthogonals)
-        for direction in C.ROOK_DIRS:
-            current = square + direction
-            while self.is_valid_square(current):
-                cf = current % 8
-                # if moving left, stop if we wrapped from file 0 to 7
-                if direction == C.LEFT and cf == 7:
-                    break
-                # if moving right, stop if we wrapped from file 7 to 0
-                if direction == C.RIGHT and cf == 0:
-                    break
-
-                piece = self.squares[current]
-                if piece != C.EMPTY:
-                    if attacking_color == 1 and piece in (C.W_ROOK, C.W_QUEEN):
-                        return True
-                    if attacking_color == -1 and piece in (C.B_ROOK, C.B_QUEEN):
-                        return True
-                    break
-                current += direction
-
-
-        # Kings
-        for direction in C.KING_DIRS:
-            target = square + direction
-            if not self.is_valid_square(target):
-                continue
-            tr, tf = target // 8, target % 8
-            if abs(tr - sq_rank) <= 1 and abs(tf - sq_file) <= 1:
-                piece = self.squares[target]
-                if attacking_color == 1 and piece == C.W_KING:
-                    return True
-                if attacking_color == -1 and piece == C.B_KING:
-                    return True
+        if rook_attacks(square, occupied) & (bitboards[C.ROOK * color] | queens):
+            return True
 
         return False
 
+    def attackers_to(self, square, occupied):
+        """Bitboard of pieces of both colours attacking square, with sliders
+        looking through the given occupancy rather than the board's"""
+        bitboards = self.bitboards
+        queens = bitboards[C.W_QUEEN] | bitboards[C.B_QUEEN]
+
+        return ((PAWN_ATTACKS[-1][square] & bitboards[C.W_PAWN]) |
+                (PAWN_ATTACKS[1][square] & bitboards[C.B_PAWN]) |
+                (KNIGHT_ATTACKS[square] & (bitboards[C.W_KNIGHT] | bitboards[C.B_KNIGHT])) |
+                (KING_ATTACKS[square] & (bitboards[C.W_KING] | bitboards[C.B_KING])) |
+                (bishop_attacks(square, occupied) & (bitboards[C.W_BISHOP] | bitboards[C.B_BISHOP] | queens)) |
+                (rook_attacks(square, occupied) & (bitboards[C.W_ROOK] | bitboards[C.B_ROOK] | queens)))
+
     def is_insufficient_material(self):
-        pieces = [p for p in self.squares if p != C.EMPTY]
+        occupied = self.occupancy[0]
+        piece_count = occupied.bit_count()
+        # nearly every position has more than four pieces on the board
+        if piece_count > 4:
+            return False
+
+        bitboards = self.bitboards
+        kings = bitboards[C.W_KING] | bitboards[C.B_KING]
 
         # King vs King
-        if all(abs(p) == C.KING for p in pieces):
+        if occupied == kings:
             return True
 
         # King + minor piece vs King
-        if len(pieces) == 3:
-            non_king = [p for p in pieces if abs(p) != C.KING][0]
-            if abs(non_king) in (C.KNIGHT, C.BISHOP):
+        if piece_count == 3:
+            minors = (bitboards[C.W_KNIGHT] | bitboards[C.B_KNIGHT] |
+                      bitboards[C.W_BISHOP] | bitboards[C.B_BISHOP])
+            if minors:
                 return True
 
         # King + bishop vs King + bishop (same color bishops)
-        if len(pieces) == 4:
-            bishops = [(i, p) for i, p in enumerate(self.squares) if abs(p) == C.BISHOP]
-            if len(bishops) == 2 and bishops[0][1] * bishops[1][1] < 0:
-                colors = [(sq // 8 + sq % 8) % 2 for sq, _ in bishops]
-                if colors[0] == colors[1]:
+        if piece_count == 4:
+            white_bishop = bitboards[C.W_BISHOP]
+            black_bishop = bitboards[C.B_BISHOP]
+            if white_bishop and black_bishop:
+                if bool(white_bishop & LIGHT_SQUARES) == bool(black_bishop & LIGHT_SQUARES):
                     return True
 
         return False
@@ -1,199 +1,365 @@
 from engine.move import Move
+from engine.bitboards import (FULL, NOT_FILE_A, NOT_FILE_H, RANK_3, RANK_6, PROMOTION_RANKS,
+                              SQUARE_BB, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN,
+                              bishop_attacks, rook_attacks, queen_attacks)
 import engine.constants as C
 
-def generate_pawn_moves(board, square):
-    moves = []
-    rank = square // 8
-    file = square %  8
-
-    direction  = C.UP if board.turn == 1 else C.DOWN
-    start_rank = C.WHITE_PAWN_START_RANK if board.turn == 1 else C.BLACK_PAWN_START_RANK
-
-    forward_one = square + direction
-    if 0 <= forward_one < 64 and board.squares[forward_one] == C.EMPTY:
-        # check for promotion
-        rank = forward_one // 8
-        if (board.turn == 1 and rank == C.WHITE_PROMOTION_RANK) or \
-            (board.turn == -1 and rank == C.BLACK_PROMOTION_RANK):
-            moves.extend(generate_promotion_moves(board, square, forward_one, is_capture=False))
-        else:
-            moves.append(Move.encode_move(square, forward_one))
-        
-        if (square // 8) == start_rank:
-            forward_two = forward_one + direction
-            if 0 <= forward_two < 64 and board.squares[forward_two] == C.EMPTY:
-                moves.append(Move.encode_move(square, forward_two))
-
-    # captures
-    for capture_dir in [direction + C.LEFT, direction + C.RIGHT]:
-        capture_square = square + capture_dir
-
-        if not (0 <= capture_square < 64):
-            continue
-        
-        capture_file = capture_square %  8
-
-        if abs(capture_file - file) > 1:
-            continue
-        
-        target = board.squares[capture_square]
+# All generators are set-wise: they take every piece of one type for the side
+# to move at once and append encoded moves to the `moves` list passed in.
 
-        if target != C.EMPTY and board.turn * target < 0:
-            capture_rank = capture_square // 8
-            if (board.turn == 1 and capture_rank == C.WHITE_PROMOTION_RANK) or \
-               (board.turn == -1 and capture_rank == C.BLACK_PROMOTION_RANK):
-                moves.extend(generate_promotion_moves(board, square, capture_square, is_capture=True))
+def _add_pawn_moves(moves, targets, delta, flags, promotion_flags):
+    # delta is (to_sq - from_sq) for every target in the set
+    while targets:
+        low = targets & -targets
+        to_sq = low.bit_length() - 1
+        targets ^= low
+        from_sq = to_sq - delta
+        if low & PROMOTION_RANKS:
+            for promo in promotion_flags:
+                moves.append(from_sq | (to_sq << 6) | (promo << 12))
+        else:
+            moves.append(from_sq | (to_sq << 6) | (flags << 12))
 
-            else:
-                moves.append(Move.encode_move(square, capture_square, C.CAPTURE))
+def _add_piece_moves(moves, from_sq, targets, enemy):
+    while targets:
+        low = targets & -targets
+        to_sq = low.bit_length() - 1
+        targets ^= low
+        if low & enemy:
+            moves.append(from_sq | (to_sq << 6) | (C.CAPTURE << 12))
+        else:
+            moves.append(from_sq | (to_sq << 6))
 
-        elif capture_square == board.en_passant and board.enpassant_available():
-            moves.append(Move.encode_move(square, capture_square, C.EN_PASSANT))
-    
-    return moves
+QUIET_PROMOTIONS   = (C.PROMOTION_QUEEN, C.PROMOTION_ROOK, C.PROMOTION_BISHOP, C.PROMOTION_KNIGHT)
+CAPTURE_PROMOTIONS = (C.PROMOTION_QUEEN_CAPTURE, C.PROMOTION_ROOK_CAPTURE,
+                      C.PROMOTION_BISHOP_CAPTURE, C.PROMOTION_KNIGHT_CAPTURE)
 
-def generate_knight_moves(board, square):
-    # pseudo legal knight moves
-    moves = []
+def generate_pawn_moves(board, moves):
+    us = board.turn
+    pawns = board.bitboards[C.PAWN * us]
+    if not pawns:
+        return moves
 
-    rank = square // 8
-    file = square %  8
+    empty = ~board.occupancy[0] & FULL
+    enemy = board.occupancy[-us]
 
-    for offset in C.KNIGHT_DIRS:
-        new_square = square + offset
+    if us == 1:
+        single = (pawns >> 8) & empty
+        double = ((single & RANK_3) >> 8) & empty
+        left   = ((pawns & NOT_FILE_A) >> 9) & enemy
+        right  = ((pawns & NOT_FILE_H) >> 7) & enemy
+        push, left_delta, right_delta = C.UP, C.UP_LEFT, C.UP_RIGHT
+    else:
+        single = (pawns << 8) & empty
+        double = ((single & RANK_6) << 8) & empty
+        left   = ((pawns & NOT_FILE_A) << 7) & enemy
+        right  = ((pawns & NOT_FILE_H) << 9) & enemy
+        push, left_delta, right_delta = C.DOWN, C.DOWN_LEFT, C.DOWN_RIGHT
 
-        if not (0 <= new_square < 64): # out of bounds
-            continue
-        
-        new_rank = new_square // 8
-        new_file = new_square %  8
+    _add_pawn_moves(moves, single, push, C.NORMAL_MOVE, QUIET_PROMOTIONS)
+    _add_pawn_moves(moves, double, 2 * push, C.NORMAL_MOVE, QUIET_PROMOTIONS)
+    _add_pawn_moves(moves, left, left_delta, C.CAPTURE, CAPTURE_PROMOTIONS)
+    _add_pawn_moves(moves, right, right_delta, C.CAPTURE, CAPTURE_PROMOTIONS)
 
-        if abs(new_rank - rank) > 2 or abs(new_file - file) > 2:
-            continue
-        
-        target_piece = board.squares[new_square]
-        if target_piece == C.EMPTY:
-            moves.append(Move.encode_move(square, new_square))
-        elif target_piece * board.turn < 0:
-            moves.append(Move.encode_move(square, new_square, C.CAPTURE))
+    # en passant: our pawns standing where an enemy pawn on the ep square would attack
+    if board.en_passant != -1:
+        attackers = PAWN_ATTACKS[-us][board.en_passant] & pawns
+        while attackers:
+            low = attackers & -attackers
+            attackers ^= low
+            moves.append(Move.encode_move(low.bit_length() - 1, board.en_passant, C.EN_PASSANT))
 
     return moves
 
-def generate_bishop_moves(board, square):
-    return generate_sliding_moves(board, square)
-
-def generate_rook_moves(board, square):
-    return generate_sliding_moves(board, square)
+def generate_knight_moves(board, moves):
+    us = board.turn
+    knights = board.bitboards[C.KNIGHT * us]
+    not_own = ~board.occupancy[us]
+    enemy = board.occupancy[-us]
 
-def generate_queen_moves(board, square):
-    return generate_sliding_moves(board, square)
-
-def generate_sliding_moves(board, square):
-    type_dirs = {
-        3: C.BISHOP_DIRS,
-        4: C.ROOK_DIRS,
-        5: C.QUEEN_DIRS
-    }
-    moves = []
+    while knights:
+        low = knights & -knights
+        square = low.bit_length() - 1
+        knights ^= low
+        _add_piece_moves(moves, square, KNIGHT_ATTACKS[square] & not_own, enemy)
 
-    piece_type = abs(board.squares[square])
-    directions = type_dirs.get(piece_type)
-    if directions is None:
-        return []
+    return moves
 
-    for direction in directions:
-        current = square + direction
+def generate_bishop_moves(board, moves):
+    return generate_sliding_moves(board, moves, C.BISHOP, bishop_attacks)
 
-        while 0 <= current < 64:
-            current_file = current %  8
+def generate_rook_moves(board, moves):
+    return generate_sliding_moves(board, moves, C.ROOK, rook_attacks)
 
+def generate_queen_moves(board, moves):
+    return generate_sliding_moves(board, moves, C.QUEEN, queen_attacks)
 
-            prev = current - direction
-            if abs((current % 8) - (prev % 8)) != 1 and direction in (C.LEFT, C.RIGHT, C.UP_LEFT, C.UP_RIGHT, C.DOWN_LEFT, C.DOWN_RIGHT):
-                break
+def generate_sliding_moves(board, moves, piece_type, attacks):
+    us = board.turn
+    sliders = board.bitboards[piece_type * us]
+    occupied = board.occupancy[0]
+    not_own = ~board.occupancy[us]
+    enemy = board.occupancy[-us]
 
-            target = board.squares[current]
+    while sliders:
+        low = sliders & -sliders
+        square = low.bit_length() - 1
+        sliders ^= low
+        _add_piece_moves(moves, square, attacks(square, occupied) & not_own, enemy)
 
-            if target == C.EMPTY: # square is empty
-                moves.append(Move.encode_move(square, current))
-                current += direction
-            elif target * board.turn < 0: # enemy piece
-                moves.append(Move.encode_move(square, current, C.CAPTURE))
-                break
-            else:    # friendly piece
-                break
     return moves
 
-def generate_king_moves(board, square):
-    moves = []
-    rank = square // 8
-    file = square %  8
+def generate_king_moves(board, moves):
+    us = board.turn
+    kings = board.bitboards[C.KING * us]
+    if not kings:
+        return moves
+
+    square = kings.bit_length() - 1
+    enemy = board.occupancy[-us]
 
     # normal moves
-    for direction in C.KING_DIRS:
-        new_square = square + direction
-        
-        if not (0 <= new_square < 64):
-            continue
-        
-        new_rank = new_square // 8
-        new_file = new_square %  8
-        if abs(new_file - file) > 1 or abs(new_rank - rank) > 1:
-            continue
-        
-        target = board.squares[new_square]
-        if not board._is_square_attacked(new_square, -board.turn):
-            if target == C.EMPTY:
-                moves.append(Move.encode_move(square, new_square))
-            elif target * board.turn < 0:
+    targets = KING_ATTACKS[square] & ~board.occupancy[us]
+    while targets:
+        low = targets & -targets
+        new_square = low.bit_length() - 1
+        targets ^= low
+        if not board._is_square_attacked(new_square, -us):
+            if low & enemy:
                 moves.append(Move.encode_move(square, new_square, C.CAPTURE))
+            else:
+                moves.append(Move.encode_move(square, new_square))
 
     # castling moves
-    if board.turn == 1: # white
-        # kingside 
-        if (board.white_king_pos == C.WHITE_KING_START and (board.castling & C.CASTLE_WK) and
-            not board.is_in_check(1) and
-            all(board.squares[sq] == C.EMPTY for sq in C.WHITE_KINGSIDE_PATH) and
-            all(not board._is_square_attacked(sq, -1) for sq in [C.WHITE_KING_START] + C.WHITE_KINGSIDE_PATH) and
-            board.squares[C.WHITE_ROOK_H1] == C.W_ROOK):
-            moves.append(Move.encode_move(C.WHITE_KING_START, C.WHITE_KINGSIDE_CASTLE, C.CASTLING))
-        
-        # queenside
-        if (board.white_king_pos == C.WHITE_KING_START and (board.castling & C.CASTLE_WQ) and
-            not board.is_in_check(1) and
-            all(board.squares[sq] == C.EMPTY for sq in C.WHITE_QUEENSIDE_PATH) and
-            all(not board._is_square_attacked(sq, -1) for sq in [C.WHITE_KING_START] + C.WHITE_QUEENSIDE_PATH) and
-            board.squares[C.WHITE_ROOK_A1] == C.W_ROOK):
-            moves.append(Move.encode_move(C.WHITE_KING_START, C.WHITE_QUEENSIDE_CASTLE, C.CASTLING))
+    if board.castling and not board.is_in_check(us):
+        _add_castling_moves(board, moves, square)
 
-    else: # black
-        if (board.black_king_pos == C.BLACK_KING_START and (board.castling & C.CASTLE_BK) and
-            not board.is_in_check(-1) and
-            all(board.squares[sq] == C.EMPTY for sq in C.BLACK_KINGSIDE_PATH) and
-            all(not board._is_square_attacked(sq, 1) for sq in [C.BLACK_KING_START] + C.BLACK_KINGSIDE_PATH) and
-            board.squares[C.BLACK_ROOK_H8] == C.B_ROOK):
-            moves.append(Move.encode_move(C.BLACK_KING_START, C.BLACK_KINGSIDE_CASTLE, C.CASTLING))
-        
-        # queenside
-        if (board.black_king_pos == C.BLACK_KING_START and (board.castling & C.CASTLE_BQ) and
-            not board.is_in_check(-1) and
-            all(board.squares[sq] == C.EMPTY for sq in C.BLACK_QUEENSIDE_PATH) and
-            all(not board._is_square_attacked(sq, 1) for sq in [C.BLACK_KING_START] + C.BLACK_QUEENSIDE_PATH) and
-            board.squares[C.BLACK_ROOK_A8] == C.B_ROOK):
-            moves.append(Move.encode_move(C.BLACK_KING_START, C.BLACK_QUEENSIDE_CASTLE, C.CASTLING))
-        
     return moves
 
 def generate_promotion_moves(board, from_sq, to_sq, is_capture=False):
+    promotions = CAPTURE_PROMOTIONS if is_capture else QUIET_PROMOTIONS
+    return [Move.encode_move(from_sq, to_sq, promo) for promo in promotions]
+
+
+# --- legal move generation ---
+# Checkers and pins are worked out once per node, then every generator is
+# restricted to the destination squares that keep the king safe, so no move
+# has to be made and unmade to test it.
+
+def _attacked(bitboards, square, color, occupied):
+    # is `square` attacked by `color` with the given occupancy (used with the king lifted off)
+    if PAWN_ATTACKS[-color][square] & bitboards[C.PAWN * color]:
+        return True
+    if KNIGHT_ATTACKS[square] & bitboards[C.KNIGHT * color]:
+        return True
+    if KING_ATTACKS[square] & bitboards[C.KING * color]:
+        return True
+    queens = bitboards[C.QUEEN * color]
+    if bishop_attacks(square, occupied) & (bitboards[C.BISHOP * color] | queens):
+        return True
+    return bool(rook_attacks(square, occupied) & (bitboards[C.ROOK * color] | queens))
+
+def _legal_pawn_moves(board, moves, pawns, target_mask, captures, quiets):
+    us = board.turn
+    empty = ~board.occupancy[0] & FULL
+
+    if us == 1:
+        single = (pawns >> 8) & empty
+        push, left_delta, right_delta = C.UP, C.UP_LEFT, C.UP_RIGHT
+    else:
+        single = (pawns << 8) & empty
+        push, left_delta, right_delta = C.DOWN, C.DOWN_LEFT, C.DOWN_RIGHT
+
+    # push promotions count as captures so the capture stage sees every material gain
+    if captures:
+        enemy = board.occupancy[-us] & target_mask
+        if us == 1:
+            left  = ((pawns & NOT_FILE_A) >> 9) & enemy
+            right = ((pawns & NOT_FILE_H) >> 7) & enemy
+        else:
+            left  = ((pawns & NOT_FILE_A) << 7) & enemy
+            right = ((pawns & NOT_FILE_H) << 9) & enemy
+        _add_pawn_moves(moves, left, left_delta, C.CAPTURE, CAPTURE_PROMOTIONS)
+        _add_pawn_moves(moves, right, right_delta, C.CAPTURE, CAPTURE_PROMOTIONS)
+        _add_pawn_moves(moves, single & PROMOTION_RANKS & target_mask, push, C.NORMAL_MOVE, QUIET_PROMOTIONS)
+
+    if quiets:
+        if us == 1:
+            double = ((single & RANK_3) >> 8) & empty
+        else:
+            double = ((single & RANK_6) << 8) & empty
+        _add_pawn_moves(moves, single & ~PROMOTION_RANKS & target_mask, push, C.NORMAL_MOVE, QUIET_PROMOTIONS)
+        _add_pawn_moves(moves, double & target_mask, 2 * push, C.NORMAL_MOVE, QUIET_PROMOTIONS)
+
+def _legal_en_passant(board, moves, king_sq, from_mask):
+    # en passant removes two pieces from one rank, so test the resulting position directly
+    us = board.turn
+    ep = board.en_passant
+    bitboards = board.bitboards
+    attackers = PAWN_ATTACKS[-us][ep] & bitboards[C.PAWN * us] & from_mask
+    if not attackers:
+        return
+
+    captured_bb = SQUARE_BB[ep + 8 * us] # pawn that just double pushed
+    enemy_pawns = bitboards[-C.PAWN * us] ^ captured_bb
+    enemy_knights = bitboards[-C.KNIGHT * us]
+    enemy_queens = bitboards[-C.QUEEN * us]
+    enemy_diagonal = bitboards[-C.BISHOP * us] | enemy_queens
+    enemy_straight = bitboards[-C.ROOK * us] | enemy_queens
+
+    while attackers:
+        low = attackers & -attackers
+        attackers ^= low
+        occupied = board.occupancy[0] ^ low ^ captured_bb ^ SQUARE_BB[ep]
+        if (PAWN_ATTACKS[us][king_sq] & enemy_pawns or
+            KNIGHT_ATTACKS[king_sq] & enemy_knights or
+            bishop_attacks(king_sq, occupied) & enemy_diagonal or
+            rook_attacks(king_sq, occupied) & enemy_straight):
+            continue
+        moves.append(Move.encode_move(low.bit_length() - 1, ep, C.EN_PASSANT))
+
+def generate_legal_moves(board, captures=True, quiets=True, from_mask=FULL):
+    """Legal moves for the side to move. captures=False or quiets=False
+    restrict generation to one stage: captures include en passant and every
+    promotion, quiets are the remaining moves including castling. from_mask
+    limits generation to pieces standing on those squares."""
     moves = []
-    if is_capture:
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_QUEEN_CAPTURE))
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_ROOK_CAPTURE))
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_BISHOP_CAPTURE))
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_KNIGHT_CAPTURE))
+    us = board.turn
+    them = -us
+    bitboards = board.bitboards
+    occupied = board.occupancy[0]
+    own = board.occupancy[us]
+    enemy = board.occupancy[them]
+
+    # squares a piece may land on for the requested stage(s)
+    stage_mask = 0
+    if captures:
+        stage_mask |= enemy
+    if quiets:
+        stage_mask |= ~occupied & FULL
+
+    king_bb = bitboards[C.KING * us]
+    king_sq = king_bb.bit_length() - 1
+
+    enemy_queens = bitboards[C.QUEEN * them]
+    enemy_diagonal = bitboards[C.BISHOP * them] | enemy_queens
+    enemy_straight = bitboards[C.ROOK * them] | enemy_queens
+
+    checkers = ((PAWN_ATTACKS[us][king_sq] & bitboards[C.PAWN * them]) |
+                (KNIGHT_ATTACKS[king_sq] & bitboards[C.KNIGHT * them]) |
+                (bishop_attacks(king_sq, occupied) & enemy_diagonal) |
+                (rook_attacks(king_sq, occupied) & enemy_straight))
+
+    # king moves, tested with the king lifted so it cannot hide behind itself on a ray
+    if king_bb & from_mask:
+        occupied_without_king = occupied ^ king_bb
+        targets = KING_ATTACKS[king_sq] & stage_mask
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            to_sq = low.bit_length() - 1
+            if not _attacked(bitboards, to_sq, them, occupied_without_king):
+                if low & enemy:
+                    moves.append(king_sq | (to_sq << 6) | (C.CAPTURE << 12))
+                else:
+                    moves.append(king_sq | (to_sq << 6))
+
+    if checkers & (checkers - 1): # double check, only the king may move
+        return moves
+
+    if checkers:
+        # capture the checker or block the line between it and the king
+        checker_sq = checkers.bit_length() - 1
+        target_mask = checkers | BETWEEN[king_sq][checker_sq]
     else:
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_QUEEN))
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_ROOK))
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_BISHOP))
-        moves.append(Move.encode_move(from_sq, to_sq, C.PROMOTION_KNIGHT))
+        target_mask = FULL
+        if quiets and king_bb & from_mask:
+            _add_castling_moves(board, moves, king_sq)
+
+    # pinned pieces: exactly one of our pieces between the king and an enemy slider
+    pinned = 0
+    pin_masks = {}
+    snipers = ((bishop_attacks(king_sq, enemy) & enemy_diagonal) |
+               (rook_attacks(king_sq, enemy) & enemy_straight))
+    while snipers:
+        low = snipers & -snipers
+        snipers ^= low
+        line = BETWEEN[king_sq][low.bit_length() - 1]
+        blockers = line & occupied
+        if blockers and not blockers & (blockers - 1) and blockers & own:
+            pinned |= blockers
+            pin_masks[blockers.bit_length() - 1] = line | low
+
+    # pawns: unpinned ones set-wise, pinned ones one at a time along their pin ray
+    pawns = bitboards[C.PAWN * us] & from_mask
+    if pawns:
+        _legal_pawn_moves(board, moves, pawns & ~pinned, target_mask, captures, quiets)
+        pinned_pawns = pawns & pinned
+        while pinned_pawns:
+            low = pinned_pawns & -pinned_pawns
+            pinned_pawns ^= low
+            _legal_pawn_moves(board, moves, low, target_mask & pin_masks[low.bit_length() - 1],
+                              captures, quiets)
+        if captures and board.en_passant != -1:
+            _legal_en_passant(board, moves, king_sq, from_mask)
+
+    target_mask &= stage_mask
+
+    # knights: a pinned knight can never move
+    knights = bitboards[C.KNIGHT * us] & ~pinned & from_mask
+    while knights:
+        low = knights & -knights
+        knights ^= low
+        square = low.bit_length() - 1
+        _add_piece_moves(moves, square, KNIGHT_ATTACKS[square] & target_mask, enemy)
+
+    # sliders
+    for piece_type, attacks in ((C.BISHOP, bishop_attacks), (C.ROOK, rook_attacks), (C.QUEEN, queen_attacks)):
+        sliders = bitboards[piece_type * us] & from_mask
+        while sliders:
+            low = sliders & -sliders
+            sliders ^= low
+            square = low.bit_length() - 1
+            targets = attacks(square, occupied) & target_mask
+            if low & pinned:
+                targets &= pin_masks[square]
+            _add_piece_moves(moves, square, targets, enemy)
+
     return moves
+
+def is_legal_move(board, move):
+    # used to validate moves from outside the generator (hash and killer moves)
+    from_sq = move & 0x3F
+    if board.squares[from_sq] * board.turn <= 0:
+        return False
+    return move in generate_legal_moves(board, from_mask=SQUARE_BB[from_sq])
+
+def _add_castling_moves(board, moves, king_sq):
+    # shared by both generators, only called when not in check
+    us = board.turn
+    occupied = board.occupancy[0]
+
+    if us == 1:
+        if king_sq != C.WHITE_KING_START or not board.castling & (C.CASTLE_WK | C.CASTLE_WQ):
+            return
+        rooks = board.bitboards[C.W_ROOK]
+        if ((board.castling & C.CASTLE_WK) and rooks & SQUARE_BB[C.WHITE_ROOK_H1] and
+            not occupied & C.WHITE_KINGSIDE_PATH_BB and
+            not any(board._is_square_attacked(sq, -1) for sq in C.WHITE_KINGSIDE_PATH)):
+            moves.append(Move.encode_move(C.WHITE_KING_START, C.WHITE_KINGSIDE_CASTLE, C.CASTLING))
+        if ((board.castling & C.CASTLE_WQ) and rooks & SQUARE_BB[C.WHITE_ROOK_A1] and
+            not occupied & C.WHITE_QUEENSIDE_PATH_BB and
+            not any(board._is_square_attacked(sq, -1) for sq in C.WHITE_QUEENSIDE_KING_PATH)):
+            moves.append(Move.encode_move(C.WHITE_KING_START, C.WHITE_QUEENSIDE_CASTLE, C.CASTLING))
+    else:
+        if king_sq != C.BLACK_KING_START or not board.castling & (C.CASTLE_BK | C.CASTLE_BQ):
+            return
+        rooks = board.bitboards[C.B_ROOK]
+        if ((board.castling & C.CASTLE_BK) and rooks & SQUARE_BB[C.BLACK_ROOK_H8] and
+            not occupied & C.BLACK_KINGSIDE_PATH_BB and
+            not any(board._is_square_attacked(sq, 1) for sq in C.BLACK_KINGSIDE_PATH)):
+            moves.append(Move.encode_move(C.BLACK_KING_START, C.BLACK_KINGSIDE_CASTLE, C.CASTLING))
+        if ((board.castling & C.CASTLE_BQ) and rooks & SQUARE_BB[C.BLACK_ROOK_A8] and
+            not occupied & C.BLACK_QUEENSIDE_PATH_BB and
+            not any(board._is_square_attacked(sq, 1) for sq in C.BLACK_QUEENSIDE_KING_PATH)):
+            moves.append(Move.encode_move(C.BLACK_KING_START, C.BLACK_QUEENSIDE_CASTLE, C.CASTLING))
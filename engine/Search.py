@@ -1,34 +1,692 @@
+import math
+import threading
+import time
 from engine.EngineBoard import Board
+from engine.eval_config import PIECE_VALUES
+from engine.bitboards import bishop_attacks, rook_attacks
+from engine.transposition import TranspositionTable, EXACT, LOWER, UPPER
 import engine.constants as C
 
-def negamax(board, depth, alpha, beta):
-    if depth == 0 or board.is_terminal():
-        return board.evaluate()
+CHECK_EVERY = 1023 # look at the clock, node budget and stop flag when nodes & this == 0
 
-    max_value = -float("inf")
-    for move in board.generate_legal_moves():
-        board.make_move(move)
-        value = -negamax(board, depth - 1, -beta, -alpha)
-        board.unmake_move()
+# late move reductions by [depth][moves already searched], grows with both
+LMR_TABLE = [[0] * 64] + [[0] + [int(C.LMR_BASE + math.log(d) * math.log(m) / C.LMR_DIVISOR) for m in range(1, 64)]
+                          for d in range(1, C.MAX_SEARCH_DEPTH + 1)]
 
-        max_value = max(max_value, value)
-        alpha = max(alpha, value)
-        if alpha > beta:
+# taking a queen with a pawn that promotes to another one
+BIG_DELTA = 2 * PIECE_VALUES[C.QUEEN] - PIECE_VALUES[C.PAWN]
+
+# MVV_LVA[victim][attacker] by piece type, victim 0 for promotions without capture
+MVV_LVA = [[victim * 8 - attacker for attacker in range(7)] for victim in range(7)]
+GOOD_CAPTURE = 1 << 10 # added to captures that don't lose material so they sort first
+
+class SearchStopped(Exception):
+    pass
+
+class SearchLimits:
+    """When a search ends. depth caps iterative deepening, nodes is a node
+    budget, movetime a fixed number of seconds, time_limit a (soft, hard)
+    pair from timeman.allocate_time. infinite ignores everything but stop()."""
+    def __init__(self, depth=None, nodes=None, movetime=None, time_limit=None, infinite=False):
+        self.depth      = depth
+        self.nodes      = nodes
+        self.movetime   = movetime
+        self.time_limit = time_limit
+        self.infinite   = infinite
+
+def is_noisy(move):
+    flags = move >> 12
+    return flags & (C.CAPTURE | C.PROMOTION) or flags == C.EN_PASSANT
+
+def capture_gain(board, move):
+    # rough material balance of a capture or promotion: victim minus attacker, kings attack for free
+    from_sq = move & 0x3F
+    to_sq   = (move >> 6) & 0x3F
+    flags   = (move >> 12) & 0xF
+
+    gain = 0
+    if flags & C.CAPTURE or flags == C.EN_PASSANT:
+        victim   = abs(board.squares[to_sq]) or C.PAWN # en passant lands on an empty square
+        attacker = abs(board.squares[from_sq])
+        gain = PIECE_VALUES[victim] - (PIECE_VALUES[attacker] if attacker != C.KING else 0)
+    if flags & C.PROMOTION:
+        gain += PIECE_VALUES[C.PROMOTION_PIECES[flags & 0b11]] - PIECE_VALUES[C.PAWN]
+    return gain
+
+def see(board, move):
+    """Static exchange evaluation: material the side to move ends up with
+    after both sides keep recapturing on the target square with their
+    cheapest attacker, each free to stop when going on would lose. Pieces
+    uncovered behind an attacker (x-rays) join the exchange."""
+    from_sq = move & 0x3F
+    to_sq   = (move >> 6) & 0x3F
+    flags   = (move >> 12) & 0xF
+
+    bitboards = board.bitboards
+    occupancy = board.occupancy
+    occupied = occupancy[0]
+    us = board.turn
+
+    if flags == C.EN_PASSANT:
+        victim = C.PAWN
+        occupied ^= 1 << (to_sq + 8 * us)
+    else:
+        victim = abs(board.squares[to_sq])
+
+    gain = [PIECE_VALUES[victim] if victim else 0]
+    attacker = abs(board.squares[from_sq])
+    if flags & C.PROMOTION:
+        attacker = C.PROMOTION_PIECES[flags & 0b11]
+        gain[0] += PIECE_VALUES[attacker] - PIECE_VALUES[C.PAWN]
+
+    diagonal = (bitboards[C.W_BISHOP] | bitboards[C.B_BISHOP] |
+                bitboards[C.W_QUEEN] | bitboards[C.B_QUEEN])
+    straight = (bitboards[C.W_ROOK] | bitboards[C.B_ROOK] |
+                bitboards[C.W_QUEEN] | bitboards[C.B_QUEEN])
+
+    attackers = board.attackers_to(to_sq, occupied)
+    from_bb = 1 << from_sq
+    side = us
+    while True:
+        # score if the piece now standing on the square gets taken
+        gain.append(PIECE_VALUES[attacker] - gain[-1])
+        if max(-gain[-2], gain[-1]) < 0:
+            break # neither side would continue from here
+
+        occupied ^= from_bb
+        if attacker in (C.PAWN, C.BISHOP, C.QUEEN):
+            attackers |= bishop_attacks(to_sq, occupied) & diagonal
+        if attacker in (C.ROOK, C.QUEEN):
+            attackers |= rook_attacks(to_sq, occupied) & straight
+        attackers &= occupied
+
+        side = -side
+        side_attackers = attackers & occupancy[side]
+        if not side_attackers:
             break
+        for attacker in (C.PAWN, C.KNIGHT, C.BISHOP, C.ROOK, C.QUEEN, C.KING):
+            candidates = side_attackers & bitboards[attacker * side]
+            if candidates:
+                break
+        from_bb = candidates & -candidates
+
+    # the last entry is speculative, fold back from the end letting either side stand pat
+    for d in range(len(gain) - 2, 0, -1):
+        gain[d - 1] = -max(-gain[d - 1], gain[d])
+    return gain[0]
+
+def capture_value(board, move):
+    # most a capture or promotion can win if the piece is never recaptured
+    flags = (move >> 12) & 0xF
+    value = PIECE_VALUES[abs(board.squares[(move >> 6) & 0x3F]) or C.PAWN] if flags & C.CAPTURE or flags == C.EN_PASSANT else 0
+    if flags & C.PROMOTION:
+        value += PIECE_VALUES[C.PROMOTION_PIECES[flags & 0b11]] - PIECE_VALUES[C.PAWN]
+    return value
+
+def mvv_lva(board, move):
+    # most valuable victim first, cheapest attacker breaks ties; promotions count the new piece
+    flags = (move >> 12) & 0xF
+    if flags & C.CAPTURE:
+        victim = abs(board.squares[(move >> 6) & 0x3F])
+    else:
+        victim = C.PAWN if flags == C.EN_PASSANT else 0
+    score = MVV_LVA[victim][abs(board.squares[move & 0x3F])]
+    if flags & C.PROMOTION:
+        score += C.PROMOTION_PIECES[flags & 0b11] * 8
+    return score
+
+def select_next(moves, scores, start):
+    # lazy selection sort: swap the best remaining move into start and return it
+    best = start
+    best_score = scores[start]
+    for i in range(start + 1, len(moves)):
+        if scores[i] > best_score:
+            best = i
+            best_score = scores[i]
+    if best != start:
+        moves[start], moves[best] = moves[best], moves[start]
+        scores[start], scores[best] = scores[best], scores[start]
+    return moves[start]
+
+def score_to_tt(score, ply):
+    # the table holds mate scores as distance from the stored node, not from the root
+    if score >= C.MATE_BOUND:
+        return score + ply
+    if score <= -C.MATE_BOUND:
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if score >= C.MATE_BOUND:
+        return score - ply
+    if score <= -C.MATE_BOUND:
+        return score + ply
+    return score
+
+def has_non_pawn_material(board):
+    us = board.turn
+    return bool(board.occupancy[us] & ~(board.bitboards[C.PAWN * us] | board.bitboards[C.KING * us]))
+
+class SearchResult:
+    """What one search found and what it cost. The counters cover the whole
+    search, including the unfinished last iteration."""
+    def __init__(self, best_move, score, depth, pv):
+        self.best_move = best_move
+        self.score     = score
+        self.depth     = depth # deepest finished iteration
+        self.pv        = pv
+
+        self.elapsed         = 0.0
+        self.iteration_times = [] # seconds spent on each finished iteration, depth 1 first
+        self.nodes           = 0  # all nodes, quiescence included
+        self.qnodes          = 0
+        self.tt_probes       = 0
+        self.tt_hits         = 0
+        self.beta_cutoffs    = 0
+        self.first_move_cutoffs = 0
+        self.null_tries      = 0
+        self.null_cutoffs    = 0
+        self.lmr_tries       = 0
+        self.lmr_researches  = 0 # reduced moves that beat alpha and were searched again
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.elapsed) if self.elapsed else 0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        # share of beta cutoffs made by the first move searched, a measure of move ordering
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    @property
+    def null_success_rate(self):
+        return self.null_cutoffs / self.null_tries if self.null_tries else 0.0
+
+    @property
+    def lmr_success_rate(self):
+        # reductions that held up without a re-search
+        return 1 - self.lmr_researches / self.lmr_tries if self.lmr_tries else 0.0
+
+    def __repr__(self):
+        return (f"SearchResult(depth={self.depth}, score={self.score}, nodes={self.nodes}, "
+                f"nps={self.nps}, time={self.elapsed:.2f}s)")
+
+class Searcher:
+    """Iterative deepening alpha-beta search. Owns everything that lives
+    across searches (transposition table, history, countermoves) and the
+    per-ply stack (killers, PV table). One search runs at a time; stop()
+    and set_time_limit() may be called from other threads while it does."""
+
+    def __init__(self, tt_size_mb=C.TT_SIZE_MB, tt=None):
+        self.tt = tt if tt is not None else TranspositionTable(tt_size_mb)
+
+        # butterfly history, history[side][move & 0xFFF] (from/to squares): how often a quiet move cut off
+        self.history = [None, [0] * 4096, [0] * 4096]
+        # quiet move that last refuted a move, indexed by that move's from/to squares
+        self.countermoves = [0] * 4096
+
+        # per-ply stack: two killer slots (quiet moves that cut off at that ply) and
+        # the triangular PV table, pv_table[ply][ply:pv_length[ply]] is the best line from ply
+        self.killers = [[0, 0] for _ in range(C.MAX_PLY)]
+        self.pv_table = [[0] * C.MAX_PLY for _ in range(C.MAX_PLY)]
+        self.pv_length = [0] * C.MAX_PLY
+
+        self.stop_event = threading.Event()
+        self.nodes = 0
+        self.node_limit = None
+        self.soft_deadline = None # no new iteration starts after this
+        self.deadline = None      # the running iteration is abandoned here
+
+        self.pv = [] # principal variation of the last finished iteration
+        self.completed_depth = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        # plain counters on the searcher are cheaper to bump than attributes of a result object
+        self.qnodes = 0
+        self.tt_probes = self.tt_hits = 0
+        self.beta_cutoffs = self.first_move_cutoffs = 0
+        self.null_tries = self.null_cutoffs = 0
+        self.lmr_tries = self.lmr_researches = 0
+
+    # --- limits ---
+
+    def stop(self):
+        """End the running search, it returns its best move so far"""
+        self.stop_event.set()
+
+    def set_time_limit(self, time_limit):
+        """Put the search on a (soft, hard) clock starting now, also while it is
+        already running (a ponder hit); None searches until stopped."""
+        if time_limit is None:
+            self.soft_deadline = self.deadline = None
+        else:
+            now = time.time()
+            # the next iteration costs several times this one, don't start it late
+            self.soft_deadline = now + time_limit[0] / 2
+            self.deadline = now + time_limit[1]
+
+    def should_stop(self):
+        # depth 1 always finishes so there is a move to play
+        if not self.completed_depth:
+            return False
+        return (self.stop_event.is_set() or
+                (self.node_limit is not None and self.nodes >= self.node_limit) or
+                (self.deadline is not None and time.time() >= self.deadline))
+
+    # --- move ordering ---
+
+    def pick_moves(self, board, ply, hash_move=0):
+        """Yield legal moves in stages, generating each stage only when the
+        previous one is used up: hash move, winning captures (MVV-LVA), killers,
+        countermove, quiet moves by history, then losing captures. Each stage
+        keeps a parallel score list and only sorts as far as it is consumed."""
+        if hash_move and board.is_legal_move(hash_move):
+            yield hash_move
+
+        captures = board.generate_captures()
+        # SEE is only needed when a heavier piece takes a lighter one
+        capture_scores = [mvv_lva(board, move) +
+                          (GOOD_CAPTURE if capture_gain(board, move) >= 0 or see(board, move) >= 0 else 0)
+                          for move in captures]
+        next_capture = 0
+        while next_capture < len(captures):
+            move = select_next(captures, capture_scores, next_capture)
+            if capture_scores[next_capture] < GOOD_CAPTURE:
+                break # only losing captures left, they go last
+            next_capture += 1
+            if move != hash_move:
+                yield move
+
+        # killers and the countermove come from other positions, check them on their own
+        # so a cutoff doesn't pay for generating every quiet move
+        ply_killers = self.killers[ply]
+        for killer in ply_killers:
+            if killer and killer != hash_move and not is_noisy(killer) and board.is_legal_move(killer):
+                yield killer
+
+        previous = board.undo_stack[board.ply - 1].move if board.ply else 0
+        counter = self.countermoves[previous & 0xFFF] if previous else 0
+        if (counter and counter != hash_move and counter not in ply_killers and
+                not is_noisy(counter) and board.is_legal_move(counter)):
+            yield counter
+
+        quiets = board.generate_quiet_moves()
+        side_history = self.history[board.turn]
+        scores = [side_history[move & 0xFFF] for move in quiets]
+        for index in range(len(quiets)):
+            move = select_next(quiets, scores, index)
+            if move != hash_move and move not in ply_killers and move != counter:
+                yield move
+
+        for index in range(next_capture, len(captures)):
+            move = select_next(captures, capture_scores, index)
+            if move != hash_move:
+                yield move
+
+    def update_pv(self, ply, move):
+        # the line at ply is move followed by the line of the child that produced it
+        pv_table = self.pv_table
+        row = pv_table[ply]
+        row[ply] = move
+        child_length = self.pv_length[ply + 1]
+        row[ply + 1:child_length] = pv_table[ply + 1][ply + 1:child_length]
+        self.pv_length[ply] = max(child_length, ply + 1)
+
+    def update_history(self, board, move, depth, tried_quiets):
+        """Reward the quiet move that cut off, penalise the quiets searched
+        before it, and remember it as the countermove to the previous move."""
+        history = self.history
+        side_history = history[board.turn]
+        bonus = depth * depth
+        side_history[move & 0xFFF] += bonus
+        for quiet in tried_quiets:
+            side_history[quiet & 0xFFF] -= bonus
+
+        if side_history[move & 0xFFF] > C.HISTORY_MAX:
+            for side in (1, -1):
+                history[side][:] = [value // 2 for value in history[side]]
+
+        previous = board.undo_stack[board.ply - 1].move if board.ply else 0
+        if previous:
+            self.countermoves[previous & 0xFFF] = move
+
+    def store_killer(self, ply, move):
+        ply_killers = self.killers[ply]
+        if ply_killers[0] != move:
+            ply_killers[1] = ply_killers[0]
+            ply_killers[0] = move
+
+    # --- search ---
+
+    def negamax(self, board, depth, alpha, beta, ply=1, allow_null=True):
+        self.nodes += 1
+        if not self.nodes & CHECK_EVERY and self.should_stop():
+            raise SearchStopped
+
+        self.pv_length[ply] = ply
+        # checkmate and stalemate show up below as an empty move loop; a single
+        # repetition is enough for a draw here, the side that can avoid it will
+        if board.halfmove >= 100 or board.is_repetition() or board.is_insufficient_material():
+            return C.DRAW_SCORE
+
+        # mate distance pruning: nothing from here beats mating on the next move,
+        # or does worse than being mated right now
+        alpha = max(alpha, -C.MATE_SCORE + ply)
+        beta = min(beta, C.MATE_SCORE - ply - 1)
+        if alpha >= beta:
+            return alpha
+
+        if depth == 0:
+            return self.quiescence(board, alpha, beta, ply)
+
+        alpha_orig = alpha
+        pv_node = beta - alpha > 1
+        hash_move = 0
+        entry = self.tt.probe(board.zobrist_key)
+        self.tt_probes += 1
+        if entry is not None:
+            self.tt_hits += 1
+            hash_move, entry_depth, entry_score, bound = entry
+            entry_score = score_from_tt(entry_score, ply)
+            # PV nodes search on so the PV table gets the whole line
+            if entry_depth >= depth and not pv_node:
+                if bound == EXACT:
+                    return entry_score
+                if bound == LOWER and entry_score >= beta:
+                    return entry_score
+                if bound == UPPER and entry_score <= alpha:
+                    return entry_score
+
+        in_check = board.is_in_check(board.turn)
+
+        # null move: if passing still fails high, a real move will too. Unsound in
+        # check, in zugzwang-prone pawn endings, and right after another null move;
+        # it can't prove a mate either, so not when beta is one
+        if (allow_null and not pv_node and not in_check and depth > C.NULL_MOVE_REDUCTION and
+                beta < C.MATE_BOUND and has_non_pawn_material(board)):
+            self.null_tries += 1
+            board.make_null_move()
+            value = -self.negamax(board, depth - 1 - C.NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False)
+            board.unmake_null_move()
+            if value >= beta:
+                self.null_cutoffs += 1
+                return beta
+
+        ply_killers = self.killers[ply]
+        max_value = -C.INFINITE
+        best_move = 0
+        moves_searched = 0
+        quiets_searched = 0
+        tried_quiets = []
+        for move in self.pick_moves(board, ply, hash_move):
+            quiet = not is_noisy(move) and move not in ply_killers and move != hash_move
+
+            # late move pruning: near the horizon the late quiet moves almost never matter
+            if (quiet and best_move and not pv_node and not in_check and depth <= C.LMP_MAX_DEPTH and
+                    quiets_searched >= C.LMP_MOVE_COUNTS[depth]):
+                continue
+
+            board.make_move(move)
+            if not best_move:
+                value = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # late quiet moves are searched shallower first, unless they give check
+                reduction = 0
+                if (quiet and depth >= C.LMR_MIN_DEPTH and moves_searched >= C.LMR_MIN_MOVES and
+                        not in_check and not board.is_in_check(board.turn)):
+                    reduction = LMR_TABLE[min(depth, C.MAX_SEARCH_DEPTH)][min(moves_searched, 63)] - pv_node
+                    reduction = max(0, min(reduction, depth - 2))
+
+                # prove the move is no better than the first with a zero window, re-search if it is
+                value = -self.negamax(board, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if reduction:
+                    self.lmr_tries += 1
+                    if value > alpha:
+                        self.lmr_researches += 1
+                        value = -self.negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < value < beta:
+                    value = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+
+            moves_searched += 1
+            if quiet:
+                quiets_searched += 1
+
+            if value > max_value:
+                max_value = value
+                best_move = move
+                if value > alpha:
+                    alpha = value
+                    self.update_pv(ply, move)
+                    if alpha >= beta:
+                        self.beta_cutoffs += 1
+                        if moves_searched == 1:
+                            self.first_move_cutoffs += 1
+                        if not is_noisy(move):
+                            self.store_killer(ply, move)
+                            self.update_history(board, move, depth, tried_quiets)
+                        break
+
+            if not is_noisy(move):
+                tried_quiets.append(move)
+
+        if not moves_searched: # no legal moves
+            return -C.MATE_SCORE + ply if in_check else C.DRAW_SCORE
+
+        if max_value <= alpha_orig:
+            bound = UPPER
+        elif max_value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(board.zobrist_key, best_move, depth, score_to_tt(max_value, ply), bound)
+
+        return max_value
+
+    def quiescence(self, board, alpha, beta, ply=1):
+        """Search captures and promotions only until the position is quiet, so
+        the horizon never scores the middle of an exchange. In check every
+        evasion is searched since standing pat is not an option."""
+        self.nodes += 1
+        self.qnodes += 1
+        if not self.nodes & CHECK_EVERY and self.should_stop():
+            raise SearchStopped
+
+        if board.is_in_check(board.turn):
+            moves = board.generate_legal_moves()
+            if not moves:
+                return -C.MATE_SCORE + ply
+            stand_pat = None
+        else:
+            stand_pat = board.evaluate()
+            if stand_pat >= beta:
+                return stand_pat
+            # not even the best possible capture would get us back to alpha
+            if stand_pat + BIG_DELTA < alpha:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            moves = board.generate_captures()
+
+        scored = [(mvv_lva(board, move), move) for move in moves]
+        scored.sort(reverse=True)
+
+        best = stand_pat if stand_pat is not None else -C.INFINITE
+        for _, move in scored:
+            if stand_pat is not None:
+                # delta pruning: this capture can't raise the score to alpha
+                if stand_pat + capture_value(board, move) + C.DELTA_MARGIN < alpha:
+                    continue
+                # losing exchanges can't improve on standing pat
+                if capture_gain(board, move) < 0 and see(board, move) < 0:
+                    continue
+
+            board.make_move(move)
+            value = -self.quiescence(board, -beta, -alpha, ply + 1)
+            board.unmake_move()
+
+            if value > best:
+                best = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        return best
+
+    def search_root(self, board, depth, alpha, beta, hash_move=0):
+        self.pv_length[0] = 0
+        alpha_orig = alpha
+        best_score = -C.INFINITE
+        best_move = None
+
+        for move in self.pick_moves(board, 0, hash_move):
+            board.make_move(move)
+            if best_move is None:
+                score = -self.negamax(board, depth - 1, -beta, -alpha)
+            else:
+                score = -self.negamax(board, depth - 1, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self.negamax(board, depth - 1, -beta, -alpha)
+            board.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.update_pv(0, move)
+                    if alpha >= beta:
+                        break
+
+        if best_move is None: # mated or stalemated at the root
+            return None, -C.MATE_SCORE if board.is_in_check(board.turn) else C.DRAW_SCORE
+
+        if best_score <= alpha_orig:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(board.zobrist_key, best_move, depth, best_score, bound)
+
+        return best_move, best_score
+
+    def aspiration_search(self, board, depth, guess, hash_move):
+        """Search the root in a narrow window around the last iteration's score,
+        widening whichever side fails until the score lands inside it. Mate
+        scores jump between iterations, so they get the full window."""
+        if depth < 2 or abs(guess) >= C.MATE_BOUND:
+            return self.search_root(board, depth, -C.INFINITE, C.INFINITE, hash_move)
+
+        delta = C.ASPIRATION_WINDOW
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            move, score = self.search_root(board, depth, alpha, beta, hash_move)
+            if score <= alpha:
+                alpha = max(score - delta, -C.INFINITE) if delta < C.ASPIRATION_MAX else -C.INFINITE
+            elif score >= beta:
+                beta = min(score + delta, C.INFINITE) if delta < C.ASPIRATION_MAX else C.INFINITE
+                hash_move = move or hash_move
+            else:
+                return move, score
+            delta *= 2
+
+    def search(self, board, limits=None, info=None):
+        """Iterative deepening: search depth 1, 2, ... until the limits say
+        stop or stop() is called, and return a SearchResult for the deepest
+        finished iteration. info, if given, is called after every finished
+        iteration as info(depth, score, pv, nodes). The last PV is also left
+        in self.pv. The limits only hold while the search runs. stop_event is
+        not cleared here so a stop() racing the start of the search is not
+        lost; clear it before starting the next one."""
+        limits = limits or SearchLimits()
+        start = time.time()
+        self.nodes = 0
+        self.reset_stats()
+        self.completed_depth = 0
+        self.pv = []
+
+        max_depth = C.MAX_SEARCH_DEPTH if limits.infinite or limits.depth is None else limits.depth
+        self.node_limit = None if limits.infinite else limits.nodes
+        if limits.infinite:
+            self.set_time_limit(None)
+        elif limits.movetime is not None:
+            # no reason to hold anything back for a later iteration
+            self.set_time_limit((2 * limits.movetime, limits.movetime))
+        else:
+            self.set_time_limit(limits.time_limit)
+
+        self.tt.new_search()
+        for ply_killers in self.killers:
+            ply_killers[0] = ply_killers[1] = 0
+        # old history still helps ordering, but the new search should outweigh it
+        for side in (1, -1):
+            self.history[side][:] = [value // 2 for value in self.history[side]]
+
+        root_ply = board.ply
+        best_move, best_score = None, -C.INFINITE
+        iteration_times = []
+
+        for depth in range(1, max_depth + 1):
+            iteration_start = time.time()
+            try:
+                # last iteration's best move is searched first
+                move, score = self.aspiration_search(board, depth, best_score, best_move or 0)
+            except SearchStopped:
+                while board.ply > root_ply:
+                    if board.undo_stack[board.ply - 1].move:
+                        board.unmake_move()
+                    else:
+                        board.unmake_null_move()
+                break
+
+            best_move, best_score = move, score
+            if move is None: # no legal moves
+                break
+            self.pv = self.pv_table[0][:self.pv_length[0]]
+            self.completed_depth = depth
+            iteration_times.append(time.time() - iteration_start)
+            if info is not None:
+                info(depth, score, self.pv, self.nodes)
+
+            if self.should_stop() or (self.soft_deadline is not None and time.time() >= self.soft_deadline):
+                break
+            # a mate found within the searched depth won't get shorter by going deeper
+            if not limits.infinite and C.MATE_SCORE - abs(score) <= depth:
+                break
 
-    return max_value
+        result = SearchResult(best_move, best_score, self.completed_depth, self.pv)
+        result.elapsed = time.time() - start
+        result.iteration_times = iteration_times
+        result.nodes, result.qnodes = self.nodes, self.qnodes
+        result.tt_probes, result.tt_hits = self.tt_probes, self.tt_hits
+        result.beta_cutoffs, result.first_move_cutoffs = self.beta_cutoffs, self.first_move_cutoffs
+        result.null_tries, result.null_cutoffs = self.null_tries, self.null_cutoffs
+        result.lmr_tries, result.lmr_researches = self.lmr_tries, self.lmr_researches
 
-def search_best_move(board, depth):
-    best_score = -float('inf')
-    best_move = None
+        # negamax can be called on its own later (root split), it must not hit this search's limits
+        self.set_time_limit(None)
+        self.node_limit = None
+        self.completed_depth = 0
+        return result
 
-    for move in board.generate_legal_moves():
-        board.make_move(move)
-        score = -negamax(board, depth - 1, -float('inf'), float('inf'))
-        board.unmake_move()
+# used by search_best_move, created on first use (its table is big) and
+# kept between calls so later moves reuse earlier work
+default_searcher = None
 
-        if score > best_score:
-            best_score = score
-            best_move = move
+def shared_searcher():
+    global default_searcher
+    if default_searcher is None:
+        default_searcher = Searcher()
+    return default_searcher
 
-    return best_move, best_score
+def search_best_move(board, depth=C.MAX_SEARCH_DEPTH, time_limit=None):
+    """Search with the shared default searcher and return (best_move, score),
+    see Searcher.search"""
+    result = shared_searcher().search(board, SearchLimits(depth=depth, time_limit=time_limit))
+    return result.best_move, result.score
@@ -0,0 +1,165 @@
+import engine.constants as C
+
+# Bit i of a bitboard is square i, so bit 0 = a8 and bit 63 = h1
+# (same reading-order indexing as Board.squares).
+
+FULL = (1 << 64) - 1
+
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+FILES = [FILE_A << f for f in range(8)]
+
+RANK_8 = 0xFF
+RANK_6 = RANK_8 << 16 # black pawns land here after one push from their start rank
+RANK_3 = RANK_8 << 40 # white pawns land here after one push from their start rank
+RANK_1 = RANK_8 << 56
+
+PROMOTION_RANKS = RANK_8 | RANK_1
+
+LIGHT_SQUARES = sum(1 << sq for sq in range(64) if (sq // 8 + sq % 8) % 2 == 0) # a8 is light
+
+SQUARE_BB = [1 << sq for sq in range(64)]
+
+def _on_board(rank, file):
+    return 0 <= rank < 8 and 0 <= file < 8
+
+def _leaper_attacks(square, deltas):
+    rank, file = divmod(square, 8)
+    bb = 0
+    for dr, df in deltas:
+        if _on_board(rank + dr, file + df):
+            bb |= 1 << ((rank + dr) * 8 + file + df)
+    return bb
+
+KNIGHT_DELTAS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_DELTAS   = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+KNIGHT_ATTACKS = [_leaper_attacks(sq, KNIGHT_DELTAS) for sq in range(64)]
+KING_ATTACKS   = [_leaper_attacks(sq, KING_DELTAS) for sq in range(64)]
+
+# indexed by colour: PAWN_ATTACKS[1] for white, PAWN_ATTACKS[-1] for black
+PAWN_ATTACKS = [
+    None,
+    [_leaper_attacks(sq, ((-1, -1), (-1, 1))) for sq in range(64)],
+    [_leaper_attacks(sq, ((1, -1), (1, 1))) for sq in range(64)],
+]
+
+# rays that stop at the edge of the board, one table per direction
+DIRECTION_DELTAS = {
+    C.UP:         (-1,  0),
+    C.DOWN:       ( 1,  0),
+    C.LEFT:       ( 0, -1),
+    C.RIGHT:      ( 0,  1),
+    C.UP_LEFT:    (-1, -1),
+    C.UP_RIGHT:   (-1,  1),
+    C.DOWN_LEFT:  ( 1, -1),
+    C.DOWN_RIGHT: ( 1,  1),
+}
+
+def _ray(square, dr, df):
+    rank, file = divmod(square, 8)
+    bb = 0
+    rank += dr
+    file += df
+    while _on_board(rank, file):
+        bb |= 1 << (rank * 8 + file)
+        rank += dr
+        file += df
+    return bb
+
+RAYS = {d: [_ray(sq, dr, df) for sq in range(64)] for d, (dr, df) in DIRECTION_DELTAS.items()}
+
+def _between(a, b):
+    # squares strictly between a and b when they share a rank, file or diagonal
+    for direction, rays in RAYS.items():
+        if rays[a] >> b & 1:
+            return rays[a] & RAYS[-direction][b]
+    return 0
+
+BETWEEN = [[_between(a, b) for b in range(64)] for a in range(64)]
+
+def _sliding_attacks(square, occupied, directions):
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            if direction > 0: # nearest blocker has the lowest index
+                first = (blockers & -blockers).bit_length() - 1
+            else:             # nearest blocker has the highest index
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[direction][first]
+        attacks |= ray
+    return attacks
+
+def _relevant_mask(square, directions):
+    # squares whose occupancy can change the attack set: each ray minus its edge square
+    mask = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        if ray:
+            edge = ray.bit_length() - 1 if direction > 0 else (ray & -ray).bit_length() - 1
+            mask |= ray ^ (1 << edge)
+    return mask
+
+def _subsets(mask):
+    # carry-rippler enumeration of every subset of mask
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return
+
+def _magic_index(occupied, mask, magic, shift):
+    return (((occupied & mask) * magic) & FULL) >> shift
+
+def _build_table(square, mask, magic, directions):
+    shift = 64 - mask.bit_count()
+    table = [0] * (1 << (64 - shift))
+    for occupied in _subsets(mask):
+        table[_magic_index(occupied, mask, magic, shift)] = _sliding_attacks(square, occupied, directions)
+    return shift, table
+
+def find_magic(square, directions, rng):
+    """Search for a magic multiplier that maps every blocker subset without
+    destructive collisions. Used to regenerate engine/magics.py"""
+    mask = _relevant_mask(square, directions)
+    shift = 64 - mask.bit_count()
+    occupancies = list(_subsets(mask))
+    attacks = [_sliding_attacks(square, occ, directions) for occ in occupancies]
+
+    while True:
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        if (((mask * magic) & FULL) >> 56).bit_count() < 6:
+            continue
+
+        used = {}
+        for occ, attack in zip(occupancies, attacks):
+            index = (((occ * magic) & FULL) >> shift)
+            if used.setdefault(index, attack) != attack:
+                break
+        else:
+            return magic
+
+# magic tables, built once at import from the precomputed multipliers
+from engine.magics import ROOK_MAGICS, BISHOP_MAGICS
+
+ROOK_MASKS   = [_relevant_mask(sq, C.ROOK_DIRS) for sq in range(64)]
+BISHOP_MASKS = [_relevant_mask(sq, C.BISHOP_DIRS) for sq in range(64)]
+
+ROOK_SHIFTS, ROOK_TABLE     = zip(*(_build_table(sq, ROOK_MASKS[sq], ROOK_MAGICS[sq], C.ROOK_DIRS)
+                                    for sq in range(64)))
+BISHOP_SHIFTS, BISHOP_TABLE = zip(*(_build_table(sq, BISHOP_MASKS[sq], BISHOP_MAGICS[sq], C.BISHOP_DIRS)
+                                    for sq in range(64)))
+
+def bishop_attacks(square, occupied):
+    return BISHOP_TABLE[square][((occupied & BISHOP_MASKS[square]) * BISHOP_MAGICS[square] & FULL) >> BISHOP_SHIFTS[square]]
+
+def rook_attacks(square, occupied):
+    return ROOK_TABLE[square][((occupied & ROOK_MASKS[square]) * ROOK_MAGICS[square] & FULL) >> ROOK_SHIFTS[square]]
+
+def queen_attacks(square, occupied):
+    return bishop_attacks(square, occupied) | rook_attacks(square, occupied)
@@ -43,6 +43,9 @@ PROMOTION_ROOK_CAPTURE   = 0b1101
 PROMOTION_BISHOP_CAPTURE = 0b1110
 PROMOTION_KNIGHT_CAPTURE = 0b1111
 
+PROMOTION                = 0b1000 # set on every promotion flag
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT) # indexed by flags & 0b11
+
 # castling masks
 CASTLE_WK = 0b0001  # white kingside (K)
 CASTLE_WQ = 0b0010  # white queenside (Q)
@@ -66,6 +69,16 @@ WHITE_QUEENSIDE_PATH = [59, 58, 57] # d1, c1, b1
 BLACK_KINGSIDE_PATH = [5, 6]     # f8, g8
 BLACK_QUEENSIDE_PATH = [3, 2, 1] # d8, c8, b8
 
+# Squares the king crosses when castling queenside (b-file may be attacked)
+WHITE_QUEENSIDE_KING_PATH = [59, 58] # d1, c1
+BLACK_QUEENSIDE_KING_PATH = [3, 2]   # d8, c8
+
+# Castling paths as bitboards (bit i = square i)
+WHITE_KINGSIDE_PATH_BB  = sum(1 << sq for sq in WHITE_KINGSIDE_PATH)
+WHITE_QUEENSIDE_PATH_BB = sum(1 << sq for sq in WHITE_QUEENSIDE_PATH)
+BLACK_KINGSIDE_PATH_BB  = sum(1 << sq for sq in BLACK_KINGSIDE_PATH)
+BLACK_QUEENSIDE_PATH_BB = sum(1 << sq for sq in BLACK_QUEENSIDE_PATH)
+
 WHITE_ROOK_H1 = 63
 WHITE_ROOK_A1 = 56
 WHITE_ROOK_F1 = 61
@@ -76,6 +89,68 @@ BLACK_ROOK_A8 = 0
 BLACK_ROOK_F8 = 5
 BLACK_ROOK_D8 = 3
 
+# rook (from, to) squares for each castling king destination
+CASTLING_ROOK_SQUARES = {
+    WHITE_KINGSIDE_CASTLE:  (WHITE_ROOK_H1, WHITE_ROOK_F1),
+    WHITE_QUEENSIDE_CASTLE: (WHITE_ROOK_A1, WHITE_ROOK_D1),
+    BLACK_KINGSIDE_CASTLE:  (BLACK_ROOK_H8, BLACK_ROOK_F8),
+    BLACK_QUEENSIDE_CASTLE: (BLACK_ROOK_A8, BLACK_ROOK_D8),
+}
+
+# castling rights that survive a move touching each square (king and rook home squares clear theirs)
+CASTLING_RIGHTS_MASK = [CASTLE_ALL] * 64
+CASTLING_RIGHTS_MASK[WHITE_KING_START] &= ~(CASTLE_WK | CASTLE_WQ)
+CASTLING_RIGHTS_MASK[BLACK_KING_START] &= ~(CASTLE_BK | CASTLE_BQ)
+CASTLING_RIGHTS_MASK[WHITE_ROOK_H1] &= ~CASTLE_WK
+CASTLING_RIGHTS_MASK[WHITE_ROOK_A1] &= ~CASTLE_WQ
+CASTLING_RIGHTS_MASK[BLACK_ROOK_H8] &= ~CASTLE_BK
+CASTLING_RIGHTS_MASK[BLACK_ROOK_A8] &= ~CASTLE_BQ
+
+# game status, see Board.status
+ONGOING, CHECKMATE, STALEMATE, DRAW = 0, 1, 2, 3
+
+# preallocated depth of the undo stack (grows past this for long games)
+MAX_PLY = 256
+
+# default transposition table size in megabytes
+TT_SIZE_MB = 16
+
+# iterative deepening stops here if the clock doesn't stop it first
+MAX_SEARCH_DEPTH = 64
+
+# search scores are integer centipawns from the side to move's view. Being mated
+# n plies from the root scores -MATE_SCORE + n, so shorter mates score higher;
+# anything past MATE_BOUND is a mate. INFINITE is outside every real score.
+INFINITE = 32000
+MATE_SCORE = 31000
+MATE_BOUND = MATE_SCORE - MAX_PLY
+DRAW_SCORE = 0
+
+# quiescence skips captures that can't lift the score to alpha even with this much to spare
+DELTA_MARGIN = 200
+
+# null-move pruning searches the position with the side to move skipped this many plies shallower
+NULL_MOVE_REDUCTION = 2
+
+# late move reductions: only from LMR_MIN_DEPTH and after LMR_MIN_MOVES moves,
+# reducing by LMR_BASE + ln(depth) * ln(move number) / LMR_DIVISOR plies
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+LMR_BASE = 0.75
+LMR_DIVISOR = 2.25
+
+# late move pruning: at depth d skip quiet moves after LMP_MOVE_COUNTS[d] of them were searched
+LMP_MAX_DEPTH = 3
+LMP_MOVE_COUNTS = (0, 8, 12, 18)
+
+# history scores are halved once any of them passes this
+HISTORY_MAX = 1 << 14
+
+# half-width of the first root window around the previous iteration's score;
+# it doubles on every fail and opens fully once past ASPIRATION_MAX
+ASPIRATION_WINDOW = 50
+ASPIRATION_MAX = 800
+
 # Pawn ranks
 WHITE_PAWN_START_RANK = 6
 BLACK_PAWN_START_RANK = 1
@@ -91,4 +166,5 @@ WHITE_PAWN_ROW = range(48, 56)
 ZOBRIST_CASTLING = Z.castling
 ZOBRIST_ENPASSANT = Z.en_passant
 ZOBRIST_TURN = Z.turn
-ZOBRIST_PIECE = Z.piece
+# indexed by signed piece like Board.bitboards; the EMPTY row is all zeros
+ZOBRIST_PIECE = [[0] * 64] + [Z.piece[p] for p in range(1, 7)] + [Z.piece[p] for p in range(-6, 0)]
@@ -1,4 +1,6 @@
 from engine.eval_config import PST_MAP, PIECE_VALUES, MOBILITY_FACTOR, PAWN_PENALTY
+from engine.bitboards import (FILES, FULL, NOT_FILE_A, NOT_FILE_H, RANK_3, RANK_6,
+                              KNIGHT_ATTACKS, KING_ATTACKS, bishop_attacks, rook_attacks)
 import engine.constants as C
 
 mirror_square = lambda x: 63 - x
@@ -12,42 +14,89 @@ def pst_value(piece, square):
     else:
         return -table[mirror_square(square)]
 
-def evaluate(board):
-    material = 0
-    pst_sum  = 0
+def psqt_entry(piece, square):
+    # material plus piece-square bonus, from white's point of view
+    val = PIECE_VALUES[abs(piece)]
+    return (val if piece > 0 else -val) + pst_value(piece, square)
 
-    for square, piece in enumerate(board.squares):
-        if piece == C.EMPTY:
-            continue
+# fused material + PST table indexed by signed piece like Board.bitboards; EMPTY scores 0
+PSQT = [[psqt_entry(piece, sq) if piece else 0 for sq in range(64)]
+        for piece in (0, 1, 2, 3, 4, 5, 6, -6, -5, -4, -3, -2, -1)]
 
-        val = PIECE_VALUES[abs(piece)]
-        material += val if piece > 0 else -val
-        pst_sum  += pst_value(piece, square)
+def compute_psqt(board):
+    # full recount, the board keeps board.psqt_score up to date incrementally
+    score = 0
+    for piece, bb in enumerate(board.bitboards):
+        table = PSQT[piece]
+        while bb:
+            low = bb & -bb
+            bb ^= low
+            score += table[low.bit_length() - 1]
+    return score
+
+def mobility(board, color):
+    # pseudo-legal move count for one side, as popcounts of attack sets (no move lists)
+    bitboards = board.bitboards
+    occupied = board.occupancy[0]
+    not_own = ~board.occupancy[color]
+    empty = ~occupied & FULL
+    enemy = board.occupancy[-color]
+
+    pawns = bitboards[C.PAWN * color]
+    if color == 1:
+        single = (pawns >> 8) & empty
+        count = (single.bit_count() + (((single & RANK_3) >> 8) & empty).bit_count() +
+                 (((pawns & NOT_FILE_A) >> 9) & enemy).bit_count() +
+                 (((pawns & NOT_FILE_H) >> 7) & enemy).bit_count())
+    else:
+        single = (pawns << 8) & empty
+        count = (single.bit_count() + (((single & RANK_6) << 8) & empty).bit_count() +
+                 (((pawns & NOT_FILE_A) << 7) & enemy).bit_count() +
+                 (((pawns & NOT_FILE_H) << 9) & enemy).bit_count())
+
+    knights = bitboards[C.KNIGHT * color]
+    while knights:
+        low = knights & -knights
+        knights ^= low
+        count += (KNIGHT_ATTACKS[low.bit_length() - 1] & not_own).bit_count()
+
+    queens = bitboards[C.QUEEN * color]
+    diagonal = bitboards[C.BISHOP * color] | queens
+    while diagonal:
+        low = diagonal & -diagonal
+        diagonal ^= low
+        count += (bishop_attacks(low.bit_length() - 1, occupied) & not_own).bit_count()
+
+    straight = bitboards[C.ROOK * color] | queens
+    while straight:
+        low = straight & -straight
+        straight ^= low
+        count += (rook_attacks(low.bit_length() - 1, occupied) & not_own).bit_count()
+
+    kings = bitboards[C.KING * color]
+    if kings:
+        count += (KING_ATTACKS[kings.bit_length() - 1] & not_own).bit_count()
+
+    return count
 
-    my_moves = board.count_pseudo_moves_for_side(board.turn)
-    opp_moves = board.count_pseudo_moves_for_side(-board.turn)
+def evaluate(board):
+    bitboards = board.bitboards
 
-    mobility_score = MOBILITY_FACTOR * (my_moves - opp_moves)
+    mobility_score = MOBILITY_FACTOR * (mobility(board, 1) - mobility(board, -1))
 
     pawn_score = 0
-    files = [0]*8
-    files_black = [0]*8
-
-    for square, piece in enumerate(board.squares):
-        if piece == C.W_PAWN:
-            file = square % 8
-            files[file] += 1
-        elif piece == C.B_PAWN:
-            file = square % 8
-            files_black[file] += 1
-
-    for f in range(8):
-        if files[f] > 1:
-            pawn_score -= PAWN_PENALTY * (files[f] - 1)
-        if files_black[f] > 1:
-            pawn_score += PAWN_PENALTY * (files_black[f] - 1)
-
-    white_score = material + pst_sum + mobility_score + pawn_score + king_safety(board)
+    white_pawns = bitboards[C.W_PAWN]
+    black_pawns = bitboards[C.B_PAWN]
+
+    for file_mask in FILES:
+        white_count = (white_pawns & file_mask).bit_count()
+        black_count = (black_pawns & file_mask).bit_count()
+        if white_count > 1:
+            pawn_score -= PAWN_PENALTY * (white_count - 1)
+        if black_count > 1:
+            pawn_score += PAWN_PENALTY * (black_count - 1)
+
+    white_score = board.psqt_score + mobility_score + pawn_score + king_safety(board)
 
     return white_score * board.turn
 
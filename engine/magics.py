@@ -0,0 +1,137 @@
+# magic multipliers for the sliding attack tables - seeded 123
+# regenerate with engine.bitboards.find_magic if the square indexing changes
+
+ROOK_MAGICS = [
+    0x2080004000201080,
+    0x8440100420004000,
+    0x2180100020018008,
+    0xc080080080061000,
+    0x4280280004001280,
+    0x02001a0010643308,
+    0x04004c0611100088,
+    0x0300008043210002,
+    0x0880802040008001,
+    0x2001802000804000,
+    0x0042004020820011,
+    0x6102001200200840,
+    0x0008808008008400,
+    0x0041800200140081,
+    0x498c003810920124,
+    0x0005000182004d00,
+    0x00c0008006482088,
+    0x0210004000200040,
+    0xa010002008002400,
+    0x0818420022001009,
+    0x0304010100080010,
+    0x6100808002000400,
+    0x8240040008100201,
+    0x0040020021104084,
+    0xa040002080004088,
+    0x01300050c0012000,
+    0x0120100080200081,
+    0x0000080080801000,
+    0x0400280180040080,
+    0x0082200801041040,
+    0x0002004200048108,
+    0x0040cc920000c401,
+    0x0400804002800160,
+    0x0100408102002200,
+    0x4009001041002000,
+    0x1010001080800800,
+    0x8408110045000800,
+    0x0400040080800200,
+    0x0305900804004142,
+    0x010c244106000084,
+    0x8080204000928000,
+    0x182020005000c000,
+    0x8040100020008080,
+    0x0100084012020020,
+    0x040c100801010004,
+    0x0008040002008080,
+    0x0000010210040048,
+    0x00a1804081020004,
+    0x1080004000200040,
+    0x0080400020100040,
+    0x0080104020010100,
+    0x0000801001080280,
+    0x0040040080080080,
+    0x0004000201004040,
+    0x001008013002c400,
+    0x0829004084010200,
+    0x0313c21021800105,
+    0x0046a2118300c202,
+    0x20030052aa402001,
+    0x0800900100691421,
+    0x2402011084204802,
+    0x0021000208040001,
+    0x3000308a1001080c,
+    0x1800404401008032,
+]
+
+BISHOP_MAGICS = [
+    0x6040480204202020,
+    0x002410c400428004,
+    0x00c1020600453001,
+    0x2104040090020005,
+    0x0834042126000820,
+    0x0022021004000424,
+    0x000404140404c030,
+    0x00c0804812300205,
+    0x4100a0200101110e,
+    0x6810480108021840,
+    0x240041091e008004,
+    0x4010022082008124,
+    0x0211040420400490,
+    0x4050a10402400910,
+    0x2009c90f08024010,
+    0x00064222a4102810,
+    0x4048800460043c00,
+    0x0104000270040100,
+    0x801000a841820052,
+    0x0014000802420a06,
+    0x0202000400940040,
+    0x0208400088084002,
+    0x0000984208010800,
+    0x0210800b00451081,
+    0x0050040041042400,
+    0x631090a0280a1082,
+    0x1021012210004200,
+    0x8024040048009090,
+    0x0001004204004040,
+    0x0001020008405000,
+    0x0081040002008441,
+    0x440042810100a800,
+    0x901008a000084210,
+    0x4204042108842104,
+    0x0401080100080040,
+    0x105a020080480080,
+    0x00004501402c0040,
+    0x0050020200002089,
+    0x0081083c80c10408,
+    0x0002004504184408,
+    0x4082101004004a04,
+    0x0002020260000200,
+    0x0002002201040811,
+    0x0818402018018100,
+    0x0000082100430c00,
+    0x0104008099000200,
+    0x4010024240401400,
+    0x80024081020c0104,
+    0x0802080248840020,
+    0x000201008a304500,
+    0x4040214654100108,
+    0x1400000042020008,
+    0x0000481002022840,
+    0x4030042004044000,
+    0x0110a49000820060,
+    0x00080208020c2002,
+    0x0101848410010400,
+    0x00800042023002c0,
+    0x0180080244140401,
+    0x0006108208460808,
+    0xc000100110020209,
+    0x40010210208d0442,
+    0x0000206005812300,
+    0x1309082108002102,
+]
+
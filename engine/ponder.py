@@ -0,0 +1,71 @@
+# pondering: after its move the engine keeps searching the position after the
+# reply it expects (the second move of its PV) while the opponent thinks.
+# The ponder search makes and unmakes moves on its board the whole time, so
+# the position it started from is copied before it runs
+import threading
+from engine.EngineBoard import Board
+from engine.Search import SearchLimits
+
+def snapshot(board):
+    return list(board.squares), board.turn
+
+def is_ponder_hit(position, board):
+    """True if board (the game after the opponent's real reply) is the
+    position the ponder search started from"""
+    squares, turn = position
+    return board.squares == squares and board.turn == turn
+
+class Ponderer:
+    """Runs the ponder search in a thread on the searcher that plays the
+    game, so its table keeps what pondering found either way."""
+
+    def __init__(self, searcher):
+        self.searcher = searcher
+        self.thread = None
+        self.board = None
+        self.position = None # self.board before the search starts moving on it
+        self.result = None
+
+    def start(self, engine_board, best_move):
+        pv = self.searcher.pv
+        if len(pv) < 2 or pv[0] != best_move:
+            return
+
+        self.board = Board.unpack(engine_board.pack())
+        self.board.make_move(best_move)
+        self.board.make_move(pv[1])
+        self.position = snapshot(self.board)
+
+        def ponder():
+            result = self.searcher.search(self.board, SearchLimits(infinite=True))
+            self.result = result.best_move, result.score
+
+        self.searcher.stop_event.clear()
+        self.thread = threading.Thread(target=ponder, daemon=True)
+        self.thread.start()
+
+    def finish(self, engine_board, time_limit):
+        """On a ponder hit let the running search go on under the real clock and
+        return its result; on a miss stop it and return (None, None)."""
+        if self.thread is None:
+            return None, None
+
+        hit = is_ponder_hit(self.position, engine_board)
+        if hit:
+            self.searcher.set_time_limit(time_limit)
+        else:
+            self.searcher.stop()
+        self.thread.join()
+        self.thread = None
+        self.searcher.stop_event.clear()
+
+        return self.result if hit else (None, None)
+
+    def stop(self):
+        """End pondering and drop its result: the game is over or a new one starts"""
+        if self.thread is None:
+            return
+        self.searcher.stop()
+        self.thread.join()
+        self.thread = None
+        self.searcher.stop_event.clear()
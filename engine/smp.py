@@ -0,0 +1,244 @@
+import atexit
+import multiprocessing as mp
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import engine.Search as Search
+from engine.Search import Searcher, SearchLimits, SearchStopped
+from engine.EngineBoard import Board
+from engine.transposition import TranspositionTable, table_bytes, EXACT
+import engine.constants as C
+
+# Lazy SMP: every process runs the same iterative deepening search on its own
+# board, and all of them read and write one transposition table in shared
+# memory. Helpers mostly feed the table; the main process plays its own result
+# unless a helper finished a deeper iteration.
+#
+# Root split is the simpler mode: the first root move is searched here to get
+# an alpha bound, the rest go to a pool of worker processes that all read a
+# shared alpha which tightens as their results come back. A worker already
+# searching a move restarts it against the new alpha, the restart is cheap
+# since its table keeps what the first attempt found.
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+HELPER_NOISE = 64 # random history so helpers don't all walk the tree in the same order
+HELPER_POLL = 0.1  # seconds between checks on helpers that haven't reported yet
+HELPER_GRACE = 2.0 # a helper still searching this long after the stop is terminated
+
+# created on first use and kept for later searches, like a Searcher's own table
+shared = None
+shared_size_mb = None
+shared_tt = None
+main_searcher = None # searches in this process, on shared_tt
+
+# helper processes stay alive between searches. Each takes tasks from its own
+# queue and reports on its own pipe, so killing a stuck helper can only break
+# its own channels, which are thrown away with it
+helpers = []
+helper_tasks = []
+helper_results = [] # receiving ends of the helpers' result pipes
+stop_event = None   # set when the main search ends; main_searcher.stop() sets it too
+
+def shared_table(size_mb=C.TT_SIZE_MB):
+    global shared, shared_size_mb, shared_tt
+    if shared is None:
+        shared = shared_memory.SharedMemory(create=True, size=table_bytes(size_mb))
+        shared_size_mb = size_mb
+        shared_tt = TranspositionTable(size_mb, shared.buf)
+    return shared_tt
+
+def release_shared_table():
+    global shared, shared_size_mb, shared_tt, main_searcher
+    shutdown_helpers() # they have the block mapped
+    if shared is not None:
+        shared_tt.release()
+        shared.close()
+        shared.unlink()
+        shared = shared_size_mb = shared_tt = main_searcher = None
+
+atexit.register(release_shared_table)
+
+def _helper(index, name, size_mb, tasks, results, stop):
+    block = shared_memory.SharedMemory(name=name)
+    table = TranspositionTable(size_mb, block.buf)
+    searcher = Searcher(tt=table)
+    searcher.stop_event = stop
+    rng = random.Random(index)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        generation, packed, limits = task
+        table.generation = generation
+        for side in (1, -1):
+            searcher.history[side][:] = [rng.randrange(HELPER_NOISE) for _ in range(4096)]
+        result = searcher.search(Board.unpack(packed), limits)
+        results.send((result.depth, result.best_move, result.score))
+
+    table.release()
+    block.close()
+
+def start_helpers(count):
+    global stop_event
+    if len(helpers) == count and all(helper.is_alive() for helper in helpers):
+        return
+    shutdown_helpers()
+    if stop_event is None:
+        stop_event = mp.Event()
+    for index in range(1, count + 1):
+        tasks = mp.Queue()
+        results, helper_end = mp.Pipe(duplex=False)
+        helper = mp.Process(target=_helper, daemon=True,
+                            args=(index, shared.name, shared_size_mb, tasks, helper_end, stop_event))
+        helper.start()
+        helper_end.close() # only the helper writes to it
+        helpers.append(helper)
+        helper_tasks.append(tasks)
+        helper_results.append(results)
+
+def shutdown_helpers():
+    for tasks in helper_tasks:
+        tasks.put(None)
+    for helper in helpers:
+        helper.join(HELPER_GRACE)
+        if helper.is_alive():
+            helper.terminate()
+    for results in helper_results:
+        results.close()
+    helpers.clear()
+    helper_tasks.clear()
+    helper_results.clear()
+
+def lazy_smp_search(board, workers=DEFAULT_WORKERS, limits=None):
+    """Searcher.search spread over `workers` processes sharing one table.
+    Helpers search until the main process finishes its own search, and
+    main_searcher.stop() ends all of them. Returns (best_move, best_score)
+    from the deepest finished iteration, preferring the main process on ties."""
+    global main_searcher
+    table = shared_table()
+    if main_searcher is None:
+        main_searcher = Searcher(tt=table)
+    if workers <= 1:
+        result = main_searcher.search(board, limits)
+        return result.best_move, result.score
+
+    start_helpers(workers - 1)
+    main_searcher.stop_event = stop_event
+    # the helpers' own limits only matter for depth, the main search decides when they stop
+    helper_limits = SearchLimits(depth=limits.depth if limits else None)
+    packed = board.pack()
+    for tasks in helper_tasks:
+        tasks.put((table.generation, packed, helper_limits))
+
+    result = main_searcher.search(board, limits)
+    best_depth, best_move, best_score = result.depth, result.best_move, result.score
+    stop_event.set()
+
+    waiting = dict(zip(helper_results, helpers))
+    deadline = time.time() + HELPER_GRACE
+    while waiting:
+        for results in wait(list(waiting), timeout=HELPER_POLL):
+            del waiting[results]
+            try:
+                helper_depth, move, score = results.recv()
+            except EOFError: # the helper died
+                continue
+            if helper_depth > best_depth and move is not None:
+                best_depth, best_move, best_score = helper_depth, move, score
+        if waiting and time.time() >= deadline:
+            # stuck helpers are killed; that only breaks their own pipes and queues,
+            # and start_helpers replaces all of them on the next search
+            for helper in waiting.values():
+                helper.terminate()
+            break
+
+    stop_event.clear()
+    return best_move, best_score
+
+# persistent pool for root splitting, each worker keeps its own Searcher between searches
+pool = None
+pool_workers = 0
+shared_alpha = None
+worker_alpha = None    # shared_alpha as seen inside a worker
+worker_searcher = None
+
+class _RootMoveSearcher(Searcher):
+    # gives up on a root move as soon as another worker raised the shared alpha,
+    # so it is searched again against the tighter bound
+    alpha = -C.INFINITE
+
+    def should_stop(self):
+        return worker_alpha.value > self.alpha
+
+def _init_root_worker(alpha):
+    global worker_alpha, worker_searcher
+    worker_alpha = alpha
+    worker_searcher = _RootMoveSearcher()
+
+def _search_root_move(packed, depth, generation):
+    # packed is the position after the root move, scored from the root side's view;
+    # the table ages once per root search, not once per move
+    worker_searcher.tt.generation = generation
+    while True:
+        board = Board.unpack(packed)
+        alpha = worker_searcher.alpha = worker_alpha.value
+        try:
+            return -worker_searcher.negamax(board, depth - 1, -C.INFINITE, -alpha)
+        except SearchStopped:
+            pass
+
+def root_pool(workers):
+    global pool, pool_workers, shared_alpha
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.shutdown()
+        shared_alpha = mp.Value('i', -C.INFINITE)
+        pool = ProcessPoolExecutor(workers, initializer=_init_root_worker, initargs=(shared_alpha,))
+        pool_workers = workers
+    return pool
+
+def shutdown_root_pool():
+    global pool, pool_workers
+    if pool is not None:
+        pool.shutdown()
+        pool, pool_workers = None, 0
+
+atexit.register(shutdown_root_pool)
+
+def root_split_search(board, depth, workers=DEFAULT_WORKERS, searcher=None):
+    """Fixed-depth search with the root moves shared out to a process pool.
+    searcher (the default one if not given) orders the root moves and
+    searches the first. Returns (best_move, best_score) like Searcher.search."""
+    searcher = searcher or Search.shared_searcher()
+    executor = root_pool(workers)
+    searcher.tt.new_search()
+    entry = searcher.tt.probe(board.zobrist_key)
+    moves = list(searcher.pick_moves(board, 0, entry[0] if entry else 0))
+    if not moves:
+        return None, -C.MATE_SCORE if board.is_in_check(board.turn) else C.DRAW_SCORE
+
+    # the first move is searched with a full window to get a bound for the rest
+    best_move = moves[0]
+    board.make_move(best_move)
+    best_score = -searcher.negamax(board, depth - 1, -C.INFINITE, C.INFINITE)
+    board.unmake_move()
+    shared_alpha.value = best_score
+
+    futures = {}
+    for move in moves[1:]:
+        board.make_move(move)
+        futures[executor.submit(_search_root_move, board.pack(), depth, searcher.tt.generation)] = move
+        board.unmake_move()
+
+    for future in as_completed(futures):
+        score = future.result()
+        if score > best_score:
+            best_move, best_score = futures[future], score
+            shared_alpha.value = best_score
+
+    searcher.tt.store(board.zobrist_key, best_move, depth, best_score, EXACT)
+    return best_move, best_score
@@ -3,6 +3,7 @@ import pytest
 from EngineBoard import Board
 from move import Move
 from constants import *
+from bitboards import bishop_attacks, rook_attacks, _sliding_attacks
 
 def square_to_coord(square):
     files = "abcdefgh"
@@ -57,6 +58,7 @@ def test_promotion():
     board.setup_starting_position()
     board.squares[52] = EMPTY
     board.squares[12] = W_PAWN
+    board.sync_from_squares()
     move = Move.encode_move(12, 4, PROMOTION_QUEEN)
     board.make_move(move)
     assert board.squares[4] == W_QUEEN
@@ -72,6 +74,7 @@ def test_en_passant():
     board.squares[35] = B_PAWN
     board.turn = -1
     board.en_passant = 44
+    board.sync_from_squares()
     move = Move.encode_move(35, 44, EN_PASSANT)
     board.make_move(move)
     assert board.squares[44] == B_PAWN
@@ -86,6 +89,7 @@ def test_castling():
     board.setup_starting_position()
     board.squares[61] = EMPTY
     board.squares[62] = EMPTY
+    board.sync_from_squares()
     move = Move.encode_move(60, 62, CASTLING)
     board.make_move(move)
     assert board.squares[62] == W_KING
@@ -99,16 +103,19 @@ def test_is_square_attacked():
     board = Board()
     board.squares = [EMPTY] * 64
     board.squares[48] = W_PAWN
+    board.sync_from_squares()
     assert board._is_square_attacked(41, 1)
     assert not board._is_square_attacked(39, 1)
 
     board.squares = [EMPTY] * 64
     board.squares[15] = B_PAWN
+    board.sync_from_squares()
     assert board._is_square_attacked(22, -1)
     assert not board._is_square_attacked(16, -1)
 
     board.squares = [EMPTY] * 64
     board.squares[56] = W_KNIGHT
+    board.sync_from_squares()
     assert board._is_square_attacked(41, 1)
     assert board._is_square_attacked(50, 1)
     assert not board._is_square_attacked(39, 1)
@@ -120,6 +127,7 @@ def test_generate_legal_moves():
     board.squares[60] = W_KING; board.white_king_pos = 60
     board.squares[4] = B_ROOK;  board.black_king_pos = 0
     board.turn = 1
+    board.sync_from_squares()
     moves1 = board.generate_legal_moves()
     assert len(moves1) > 0
 
@@ -127,6 +135,7 @@ def test_generate_legal_moves():
     board.squares[60] = W_KING; board.white_king_pos = 60
     board.squares[0] = B_ROOK;  board.black_king_pos = 4
     board.turn = 1
+    board.sync_from_squares()
     moves2 = board.generate_legal_moves()
     assert len(moves2) >= len(moves1)
 
@@ -136,6 +145,7 @@ def test_generate_legal_moves():
     board.squares[55] = B_ROOK
     board.squares[54] = B_KING; board.black_king_pos = 54
     board.turn = 1
+    board.sync_from_squares()
     moves3 = board.generate_legal_moves()
     assert moves3 == []
 
@@ -181,6 +191,7 @@ def test_rook_no_wrap_horizontal():
     board.squares[60] = B_KING
     board.black_king_pos = 60
     board.turn = 1
+    board.sync_from_squares()
     
     moves = board.generate_pseudo_legal_moves()
     move_coords = [decode_move(m) for m in moves if (m & 0x3F) == 7]
@@ -199,6 +210,7 @@ def test_queen_edge_of_board():
     board.squares[4] = B_KING
     board.black_king_pos = 4
     board.turn = 1
+    board.sync_from_squares()
     
     moves = board.generate_pseudo_legal_moves()
     move_coords = [decode_move(m) for m in moves if (m & 0x3F) == 0]
@@ -230,6 +242,7 @@ def test_pinned_piece_cannot_move():
     board.squares[4] = B_KING
     board.black_king_pos = 4
     board.turn = 1
+    board.sync_from_squares()
     
     moves = board.generate_legal_moves()
     bishop_moves = [m for m in moves if (m & 0x3F) == 52]
@@ -248,6 +261,7 @@ def test_pinned_piece_can_capture_attacker():
     board.squares[4] = B_KING
     board.black_king_pos = 4
     board.turn = 1
+    board.sync_from_squares()
     
     moves = board.generate_legal_moves()
     rook_moves = [decode_move(m) for m in moves if (m & 0x3F) == 52]
@@ -267,6 +281,7 @@ def test_must_block_check():
     board.squares[4] = B_KING
     board.black_king_pos = 4
     board.turn = 1
+    board.sync_from_squares()
 
 def test_cannot_move_into_check():
     """King cannot move into check"""
@@ -278,6 +293,7 @@ def test_cannot_move_into_check():
     board.squares[4] = B_KING
     board.black_king_pos = 4
     board.turn = 1
+    board.sync_from_squares()
     
     moves = board.generate_legal_moves()
     move_coords = [decode_move(m) for m in moves]
@@ -292,6 +308,7 @@ def test_castling_rights_lost_after_king_move():
     board.setup_starting_position()
     board.squares[61] = EMPTY
     board.squares[62] = EMPTY
+    board.sync_from_squares()
     
     # Move king and back
     king_move = Move.encode_move(60, 61)
@@ -314,6 +331,7 @@ def test_castling_rights_lost_after_rook_move():
     board.setup_starting_position()
     board.squares[61] = EMPTY
     board.squares[62] = EMPTY
+    board.sync_from_squares()
     
     # Move h1 rook
     rook_move = Move.encode_move(63, 62)
@@ -335,6 +353,7 @@ def test_en_passant_capture():
     board.squares[24] = W_PAWN  # a5
     board.squares[9] = B_PAWN   # b7
     board.turn = -1
+    board.sync_from_squares()
     
     # Black pawn moves two squares
     move = Move.encode_move(9, 25)  # b7 to b5
@@ -360,6 +379,7 @@ def test_en_passant_expires():
     board.squares[9] = B_PAWN   # b7
     board.squares[48] = W_PAWN  # a2
     board.turn = -1
+    board.sync_from_squares()
     
     # Black pawn moves two squares
     board.make_move(Move.encode_move(9, 25))  # b7 to b5
@@ -388,6 +408,7 @@ def test_promotion_all_pieces():
     board.black_king_pos = 4
     board.squares[8] = W_PAWN  # a7
     board.turn = 1
+    board.sync_from_squares()
     
     moves = board.generate_legal_moves()
     move_coords = [decode_move(m) for m in moves]
@@ -410,6 +431,7 @@ def test_promotion_with_capture():
     board.squares[8] = W_PAWN  # a7
     board.squares[1] = B_ROOK  # b8
     board.turn = 1
+    board.sync_from_squares()
     
     moves = board.generate_legal_moves()
     move_coords = [decode_move(m) for m in moves]
@@ -431,6 +453,7 @@ def test_stalemate():
     board.black_king_pos = 18
     board.squares[10] = B_QUEEN # c7
     board.turn = 1
+    board.sync_from_squares()
     
     # White king at a8 has no legal moves:
     # - a7: attacked by queen at c7
@@ -525,6 +548,53 @@ def test_perft_starting_position_depth_2():
     assert perft(2) == 400, "Should have 400 nodes at depth 2"
 
 
+def board_from_fen(fen):
+    """Build an engine board from the placement, turn, castling and ep fields of a FEN"""
+    pieces = {'p': PAWN, 'n': KNIGHT, 'b': BISHOP, 'r': ROOK, 'q': QUEEN, 'k': KING}
+    placement, turn, castling, ep = fen.split()[:4]
+
+    board = Board()
+    board.squares = [EMPTY] * 64
+    square = 0
+    for char in placement.replace('/', ''):
+        if char.isdigit():
+            square += int(char)
+        else:
+            piece = pieces[char.lower()]
+            board.squares[square] = piece if char.isupper() else -piece
+            square += 1
+
+    board.turn = 1 if turn == 'w' else -1
+    board.castling = 0
+    for char, mask in zip("KQkq", (CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ)):
+        if char in castling:
+            board.castling |= mask
+    board.en_passant = -1 if ep == '-' else coord_to_square(ep)
+    board.sync_from_squares()
+    return board
+
+KIWIPETE_FEN = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+ENDGAME_FEN  = "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"
+
+def test_perft_kiwipete_depth_2():
+    """Castling, en passant, pins and promotions all show up by depth 2"""
+    board = board_from_fen(KIWIPETE_FEN)
+    assert board.perft(1) == 48
+    assert board.perft(2) == 2039
+
+def test_perft_endgame_depth_3():
+    """Rank pins and en passant discovered checks"""
+    board = board_from_fen(ENDGAME_FEN)
+    assert board.perft(3) == 2812
+
+def test_en_passant_illegal_when_it_exposes_king_on_rank():
+    """exd3 e.p. would lift both pawns off the 4th rank and open the queen onto the king"""
+    board = board_from_fen("8/8/8/8/k2Pp2Q/8/8/3K4 b - d3 0 1")
+    move_coords = [decode_move(m) for m in board.generate_legal_moves()]
+    assert "e4xd3 e.p." not in move_coords
+    assert len(move_coords) == 6
+
+
 # === Attack Detection Tests ===
 def test_knight_attack_detection():
     """Knight attacks are detected correctly"""
@@ -535,6 +605,7 @@ def test_knight_attack_detection():
     board.white_king_pos = 60
     board.squares[4] = B_KING
     board.black_king_pos = 4
+    board.sync_from_squares()
     
     # Knight should attack these squares
     attacked = [10, 12, 17, 21, 33, 37, 42, 44]  # b6, d6, c7, f7, c3, f3, b4, e4
@@ -550,6 +621,48 @@ def test_knight_attack_detection():
             f"Knight should not attack {square_to_coord(sq)}"
 
 
+def test_magic_slider_attacks_match_ray_walk():
+    """Magic table lookups agree with walking the rays square by square"""
+    import random
+    rng = random.Random(7)
+    for _ in range(2000):
+        square = rng.randrange(64)
+        occupied = rng.getrandbits(64) & rng.getrandbits(64)
+        assert rook_attacks(square, occupied) == _sliding_attacks(square, occupied, ROOK_DIRS)
+        assert bishop_attacks(square, occupied) == _sliding_attacks(square, occupied, BISHOP_DIRS)
+
+
+def test_staged_picker_yields_every_legal_move_once():
+    """Hash move, captures, killers and quiets together cover the legal list exactly"""
+    from Search import Searcher
+    searcher = Searcher(1)
+    board = board_from_fen(KIWIPETE_FEN)
+    legal = board.generate_legal_moves()
+    quiet = board.generate_quiet_moves()
+    searcher.killers[3][:] = [quiet[0], quiet[1]]
+    hash_move = quiet[5]
+
+    picked = list(searcher.pick_moves(board, 3, hash_move))
+    assert picked[0] == hash_move
+    assert sorted(picked) == sorted(legal)
+
+def test_killer_is_tried_before_quiet_generation():
+    from Search import Searcher
+    searcher = Searcher(1)
+    board = Board()
+    board.setup_starting_position()
+    killer = board.generate_quiet_moves()[3]
+    searcher.killers[2][0] = killer
+
+    generate_quiet_moves = board.generate_quiet_moves
+    calls = []
+    board.generate_quiet_moves = lambda: calls.append(1) or generate_quiet_moves()
+    picker = searcher.pick_moves(board, 2)
+    assert next(picker) == killer  # the start position has no captures
+    assert not calls
+    next(picker)
+    assert calls == [1]
+
 
 # --- Helpers ---
 def empty_board():
@@ -559,7 +672,7 @@ def empty_board():
     b.black_king_pos = BLACK_KING_START
     b.squares[b.white_king_pos] = W_KING
     b.squares[b.black_king_pos] = B_KING
-    b.zobrist_key = b.compute_zobrist()
+    b.sync_from_squares()
     return b
 
 # --- Tests for enpassant_available ---
@@ -570,6 +683,7 @@ def testenpassant_available_white_pawn():
     b.squares[27] = B_PAWN
     b.en_passant = 19  # c6 square index (from_sq+to_sq)//2 for a double pawn push)
     b.turn = 1  # White to move
+    b.sync_from_squares()
     assert b.enpassant_available() is True
 
 def testenpassant_not_available_no_adjacent_pawn():
@@ -577,6 +691,7 @@ def testenpassant_not_available_no_adjacent_pawn():
     b.squares[40] = W_PAWN
     b.en_passant = 48
     b.turn = 1
+    b.sync_from_squares()
     assert b.enpassant_available() is False
 
 # --- Tests for is_insufficient_material ---
@@ -584,6 +699,7 @@ def test_only_kings_draw():
     b = empty_board()
     b.squares[4] = B_KING
     b.squares[60] = W_KING
+    b.sync_from_squares()
     assert b.is_insufficient_material() is True
 
 def test_king_and_bishop_vs_king_draw():
@@ -591,6 +707,7 @@ def test_king_and_bishop_vs_king_draw():
     b.squares[4] = B_KING
     b.squares[60] = W_KING
     b.squares[2] = W_BISHOP
+    b.sync_from_squares()
     assert b.is_insufficient_material() is True
 
 def test_king_and_two_bishops_not_draw():
@@ -599,31 +716,73 @@ def test_king_and_two_bishops_not_draw():
     b.squares[60] = W_KING
     b.squares[2] = W_BISHOP
     b.squares[5] = W_BISHOP
+    b.sync_from_squares()
+    assert b.is_insufficient_material() is False
+
+def test_bishops_on_same_colour_squares_draw():
+    b = empty_board()
+    b.squares[2] = W_BISHOP   # c8, light
+    b.squares[61] = B_BISHOP  # f1, light
+    b.sync_from_squares()
+    assert b.is_insufficient_material() is True
+    b.squares[61] = EMPTY
+    b.squares[62] = B_BISHOP  # g1, dark
+    b.sync_from_squares()
     assert b.is_insufficient_material() is False
 
 # --- Tests for is_threefold_repetition ---
+def shuffle_knights(b):
+    # Nf3 Nf6 Ng1 Ng8, back to the same position
+    for move in (Move.encode_move(62, 45), Move.encode_move(6, 21),
+                 Move.encode_move(45, 62), Move.encode_move(21, 6)):
+        b.make_move(move)
+
 def test_threefold_repetition_detected():
     b = Board()
-    key = b.zobrist_key
-    b.repetitions[key] = 3
+    b.setup_starting_position()
+    shuffle_knights(b)
+    shuffle_knights(b)
     assert b.is_threefold_repetition() is True
 
 def test_threefold_repetition_not_detected():
     b = Board()
-    key = b.zobrist_key
-    b.repetitions[key] = 2
+    b.setup_starting_position()
+    shuffle_knights(b)
     assert b.is_threefold_repetition() is False
+    assert b.is_repetition() is True  # twice is already a draw inside the search
+
+def test_repetition_scan_stops_at_irreversible_move():
+    b = Board()
+    b.setup_starting_position()
+    shuffle_knights(b)
+    b.make_move(Move.encode_move(52, 36))  # e4
+    b.make_move(Move.encode_move(12, 28))  # e5
+    shuffle_knights(b)
+    assert b.repetition_count() == 1
+    b.unmake_move()
+    assert b.is_repetition() is False
 
 # --- Tests for is_draw ---
 def test_draw_by_stalemate(monkeypatch):
     b = empty_board()
     b.squares[4] = B_KING
     b.squares[60] = W_KING
+    b.sync_from_squares()
     # Force has_legal_moves to return False, is_in_check to return False
     monkeypatch.setattr(b, "has_legal_moves", lambda: False)
     monkeypatch.setattr(b, "is_in_check", lambda color: False)
     assert b.is_draw() is True
 
+def test_status_single_pass():
+    assert board_from_fen(KIWIPETE_FEN).status() == ONGOING
+    # fool's mate
+    assert board_from_fen("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3").status() == CHECKMATE
+    assert board_from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1").status() == STALEMATE
+    assert board_from_fen("8/8/4k3/8/8/3NK3/8/8 w - - 0 1").status() == DRAW
+    # king boxed in, only another piece can move
+    board = board_from_fen("7k/8/8/8/8/2b5/1r6/K6N w - - 0 1")
+    assert board.has_legal_moves() and board.status() == ONGOING
+
 def test_draw_by_fifty_move_rule():
     b = Board()
     b.halfmove = 100
@@ -633,6 +792,7 @@ def test_draw_by_insufficient_material():
     b = empty_board()
     b.squares[4] = B_KING
     b.squares[60] = W_KING
+    b.sync_from_squares()
     assert b.is_draw() is True
 
 # --- Tests for hashing ---
@@ -653,6 +813,81 @@ def test_zobrist_restored_on_unmake():
     b.unmake_move()
     assert b.zobrist_key == initial_key
 
+def test_incremental_zobrist_matches_full_recompute(monkeypatch):
+    """Every make/unmake in a kiwipete perft keeps the XOR-updated key exact"""
+    monkeypatch.setattr(Board, "debug_zobrist", True)
+    board = board_from_fen(KIWIPETE_FEN)
+    base = board.zobrist_key
+    assert board.perft(2) == 2039
+    assert board.zobrist_key == base
+
+def test_null_move_flips_side_and_restores(monkeypatch):
+    monkeypatch.setattr(Board, "debug_zobrist", True)
+    # black can take e3 en passant, so the ep file is part of the key
+    board = board_from_fen("4k3/8/8/8/4Pp2/8/8/4K3 b - e3 0 1")
+    key = board.zobrist_key
+    board.make_null_move()
+    assert board.turn == 1
+    assert board.en_passant == -1
+    assert board.zobrist_key == board.compute_zobrist()
+    board.unmake_null_move()
+    assert board.turn == -1
+    assert board.en_passant == 44
+    assert board.zobrist_key == key
+
+def test_null_move_bounds_repetition_scan_but_not_fifty_move_clock():
+    b = Board()
+    b.setup_starting_position()
+    shuffle_knights(b)
+    b.make_move(Move.encode_move(62, 45))  # Nf3
+    b.make_null_move()
+    b.make_move(Move.encode_move(45, 62))  # Ng1
+    b.make_null_move()
+    assert b.halfmove == 6
+    assert not b.is_repetition()  # the start position again, but only across null moves
+    b.unmake_null_move()
+    b.unmake_move()
+    b.unmake_null_move()
+    b.unmake_move()
+    assert b.null_ply == 0 and b.is_repetition()
+
+def test_pack_round_trip():
+    board = board_from_fen("r3k2r/8/8/8/4Pp2/8/8/R3K2R b Kq e3 0 1")
+    board.halfmove, board.fullmove = 7, 42
+    copy = Board.unpack(board.pack())
+    assert len(board.pack()) == 70
+    assert copy.squares == board.squares
+    assert (copy.turn, copy.castling, copy.en_passant, copy.halfmove, copy.fullmove) == (-1, board.castling, 44, 7, 42)
+    assert copy.zobrist_key == board.zobrist_key
+    assert sorted(copy.generate_legal_moves()) == sorted(board.generate_legal_moves())
+
+def test_incremental_psqt_matches_full_recount():
+    """Running material + PST total survives captures, castling, promotions and unmake"""
+    from evaluation import compute_psqt
+    for fen in (KIWIPETE_FEN, "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1"):
+        board = board_from_fen(fen)
+        base = board.psqt_score
+        for move in board.generate_legal_moves():
+            board.make_move(move)
+            assert board.psqt_score == compute_psqt(board), decode_move(move)
+            for reply in board.generate_legal_moves():
+                board.make_move(reply)
+                assert board.psqt_score == compute_psqt(board)
+                board.unmake_move()
+            board.unmake_move()
+        assert board.psqt_score == base
+
+def test_mobility_from_attack_sets():
+    from evaluation import mobility
+    board = Board()
+    board.setup_starting_position()
+    assert mobility(board, 1) == 20
+    assert mobility(board, -1) == 20
+
+    board = board_from_fen(ENDGAME_FEN)
+    # king a5: a4 a6 b6, pawn b5: b6, pawns e2/g2: two pushes each, rook b4: a4 c4-f4 b3-b1
+    assert mobility(board, 1) == 3 + 1 + 2 + 2 + 8
+
 def test_zobristenpassant_file_bit_on_double_push():
     b = Board()
     b.setup_starting_position()
@@ -660,7 +895,7 @@ def test_zobristenpassant_file_bit_on_double_push():
     # Prepare board for the scenario
     b.turn = -1
     b.squares[28] = W_PAWN  # e5, adjacent to EP target
-    b.zobrist_key = b.compute_zobrist()   # recompute now that we've mutated the board
+    b.sync_from_squares()   # rebuild bitboards and key now that we've mutated the board
     base = b.zobrist_key
 
     from_sq, to_sq = 11, 27
@@ -0,0 +1,278 @@
+import pytest
+from EngineBoard import Board
+from timeman import allocate_time, MAX_TIME_SHARE
+import Search
+from constants import INFINITE, MATE_SCORE, MATE_BOUND, DRAW_SCORE
+from test_board import board_from_fen, KIWIPETE_FEN
+
+
+def test_allocate_time_stays_inside_the_clock():
+    for remaining in (0, 0.5, 5, 60, 600):
+        for increment in (0, 2):
+            soft, hard = allocate_time(remaining, increment, move_number=10)
+            assert 0 < soft <= hard
+            assert hard <= max(0.01, remaining * MAX_TIME_SHARE)
+
+def test_iterative_deepening_respects_time_limit():
+    import time
+    board = board_from_fen(KIWIPETE_FEN)
+    start = time.time()
+    result = Search.Searcher(1).search(board, Search.SearchLimits(time_limit=(0.05, 0.2)))
+    assert time.time() - start < 0.2 + 0.1
+    assert result.depth >= 1  # the deepest finished iteration is played
+    assert result.best_move in board.generate_legal_moves()
+    assert board.ply == 0  # aborted iterations leave the board as it was
+
+def test_quiescence_resolves_hanging_queen():
+    board = board_from_fen("4k3/8/8/3q4/4P3/8/8/4K3 w - - 0 1")
+    stand_pat = board.evaluate()
+    assert Search.Searcher(1).quiescence(board, -INFINITE, INFINITE) > stand_pat + 700
+    assert board.ply == 0
+
+def test_principal_variation_is_a_legal_line():
+    board = board_from_fen(KIWIPETE_FEN)
+    searcher = Search.Searcher(1)
+    move = searcher.search(board, Search.SearchLimits(depth=3)).best_move
+    assert searcher.pv[0] == move
+    assert len(searcher.pv) >= 2
+    for pv_move in searcher.pv:
+        assert pv_move in board.generate_legal_moves()
+        board.make_move(pv_move)
+
+def test_lmr_table_grows_with_depth_and_move_number():
+    table = Search.LMR_TABLE
+    assert table[1][40] == 0 and table[10][1] == 0
+    for depth in range(2, 20):
+        for move_number in range(2, 63):
+            assert table[depth][move_number] <= table[depth][move_number + 1]
+            assert table[depth][move_number] <= table[depth + 1][move_number]
+    assert table[12][30] >= 2
+
+def test_history_and_countermove_order_quiet_moves():
+    board = Board()
+    board.setup_starting_position()
+    quiets = board.generate_quiet_moves()
+    favourite = quiets[7]
+    searcher = Search.Searcher(1)
+    searcher.history[1][favourite & 0xFFF] = 500
+    assert next(searcher.pick_moves(board, 2)) == favourite
+
+    board.make_move(favourite)
+    reply = board.generate_quiet_moves()[4]
+    searcher.countermoves[favourite & 0xFFF] = reply
+    assert next(searcher.pick_moves(board, 3)) == reply
+
+def test_see_counts_recaptures_and_x_rays():
+    def move_for(board, uci):
+        return next(m for m in board.generate_legal_moves() if board.move_to_string(m) == uci)
+
+    # pawn defends: rook takes pawn, loses the rook for a pawn
+    board = board_from_fen("4k3/8/2p5/3p4/8/8/3R4/4K3 w - - 0 1")
+    assert Search.see(board, move_for(board, "d2d5")) == 100 - 500
+
+    # undefended pawn is simply won
+    board = board_from_fen("4k3/8/8/3p4/8/8/3R4/4K3 w - - 0 1")
+    assert Search.see(board, move_for(board, "d2d5")) == 100
+
+    # rook defends from d8 and white's second rook stands behind the first (x-ray):
+    # RxP RxR RxR wins a pawn and a rook for a rook
+    board = board_from_fen("3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1")
+    assert Search.see(board, move_for(board, "d2d5")) == 100
+
+    # attackers_to sees both colours
+    attackers = board.attackers_to(27, board.occupancy[0])  # d5
+    assert attackers == (1 << 51) | (1 << 3)  # d2 and d8, d1 is blocked
+
+def test_lazy_smp_returns_a_legal_move():
+    import smp
+    board = board_from_fen(KIWIPETE_FEN)
+    move, score = smp.lazy_smp_search(board, workers=2, limits=Search.SearchLimits(depth=2))
+    assert move in board.generate_legal_moves()
+    helper = smp.helpers[0]
+    smp.lazy_smp_search(board, workers=2, limits=Search.SearchLimits(depth=2))
+    assert smp.helpers == [helper] and helper.is_alive()  # kept for the next search
+    smp.release_shared_table()
+    assert not smp.helpers
+
+def test_lazy_smp_helpers_stop_with_the_main_search():
+    import smp, threading, time
+    board = board_from_fen(KIWIPETE_FEN)
+    start = time.time()
+    move, score = smp.lazy_smp_search(board, workers=3, limits=Search.SearchLimits(movetime=0.3))
+    assert move in board.generate_legal_moves()
+    assert time.time() - start < 0.3 + smp.HELPER_GRACE
+
+    # an infinite search, helpers included, ends on stop()
+    threading.Timer(0.3, lambda: smp.main_searcher.stop()).start()
+    move, score = smp.lazy_smp_search(board, workers=3, limits=Search.SearchLimits(infinite=True))
+    assert move in board.generate_legal_moves()
+    assert not smp.stop_event.is_set()  # cleared for the next search
+    smp.release_shared_table()
+
+def test_lazy_smp_survives_a_killed_helper():
+    import smp, threading
+    board = board_from_fen(KIWIPETE_FEN)
+    smp.lazy_smp_search(board, workers=3, limits=Search.SearchLimits(depth=1))
+    victim = smp.helpers[0]
+    threading.Timer(0.1, victim.kill).start()
+    move, score = smp.lazy_smp_search(board, workers=3, limits=Search.SearchLimits(movetime=0.3))
+    assert move in board.generate_legal_moves()
+
+    move, score = smp.lazy_smp_search(board, workers=3, limits=Search.SearchLimits(movetime=0.1))
+    assert move in board.generate_legal_moves()
+    assert victim not in smp.helpers and all(helper.is_alive() for helper in smp.helpers)
+    smp.release_shared_table()
+
+def test_root_split_returns_a_legal_move():
+    import smp
+    board = board_from_fen(KIWIPETE_FEN)
+    key = board.zobrist_key
+    move, score = smp.root_split_search(board, 2, workers=2)
+    assert move in board.generate_legal_moves()
+    assert board.zobrist_key == key and board.ply == 0
+    smp.shutdown_root_pool()
+
+def test_root_split_worker_follows_the_shared_alpha():
+    import smp, multiprocessing as mp
+    alpha = mp.Value('i', -INFINITE)
+    smp._init_root_worker(alpha)  # as the pool does in each worker
+    board = board_from_fen(KIWIPETE_FEN)
+    board.make_move(board.generate_legal_moves()[0])
+    smp._search_root_move(board.pack(), 3, 5)
+    smp._search_root_move(board.pack(), 3, 5)
+    assert smp.worker_searcher.tt.generation == 5  # one generation for the whole root search
+
+    # a running move gives up once another worker raises alpha past the one it started with
+    smp.worker_searcher.alpha = 10
+    assert not smp.worker_searcher.should_stop()
+    alpha.value = 20
+    assert smp.worker_searcher.should_stop()
+
+def test_ponder_hit_is_checked_against_the_starting_position():
+    import threading, time
+    from ponder import snapshot, is_ponder_hit
+    board = board_from_fen(KIWIPETE_FEN)
+    position = snapshot(board)
+    game = board_from_fen(KIWIPETE_FEN)
+    searcher = Search.Searcher(1)
+    worker = threading.Thread(target=searcher.search, args=(board, Search.SearchLimits(infinite=True)))
+    worker.start()
+    time.sleep(0.2)
+    try:
+        # the search is somewhere inside its tree, the snapshot still matches
+        assert is_ponder_hit(position, game)
+        game.make_move(game.generate_legal_moves()[0])
+        assert not is_ponder_hit(position, game)
+    finally:
+        searcher.stop()
+        worker.join()
+
+def test_root_split_after_a_timed_search():
+    import smp, time
+    board = board_from_fen(KIWIPETE_FEN)
+    searcher = Search.Searcher(1)
+    searcher.search(board, Search.SearchLimits(time_limit=(0.1, 0.2)))
+    time.sleep(0.3)  # past the old deadline
+    move, score = smp.root_split_search(board, 3, workers=2, searcher=searcher)
+    assert move in board.generate_legal_moves()
+    assert board.ply == 0
+    smp.shutdown_root_pool()
+
+def test_pondering_stops_when_the_game_ends():
+    from ponder import Ponderer
+    board = board_from_fen(KIWIPETE_FEN)
+    searcher = Search.Searcher(1)
+    result = searcher.search(board, Search.SearchLimits(depth=3))
+    ponderer = Ponderer(searcher)
+    ponderer.start(board, result.best_move)
+    thread = ponderer.thread
+    assert thread.is_alive()
+
+    # the opponent's reply ended the game (or the game was reset), so the engine
+    # never searches again to finish the ponder search; the GUI stops it instead
+    ponderer.stop()
+    assert not thread.is_alive() and ponderer.thread is None
+    assert not searcher.stop_event.is_set()  # ready for the next game
+    ponderer.stop()  # and a second stop is harmless
+
+def test_stop_ends_an_infinite_search():
+    import threading, time
+    board = board_from_fen(KIWIPETE_FEN)
+    searcher = Search.Searcher(1)
+    result = []
+    worker = threading.Thread(target=lambda: result.append(searcher.search(board, Search.SearchLimits(infinite=True))))
+    worker.start()
+    time.sleep(0.3)
+    searcher.stop()
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+    assert result[0].best_move in board.generate_legal_moves()
+    assert board.ply == 0
+
+def test_node_budget_stops_after_depth_one():
+    board = board_from_fen(KIWIPETE_FEN)
+    searcher = Search.Searcher(1)
+    result = searcher.search(board, Search.SearchLimits(nodes=3000))
+    assert result.best_move in board.generate_legal_moves()
+    # the budget is checked every CHECK_EVERY + 1 nodes, depth 1 always finishes
+    assert result.depth == 1 or result.nodes <= 3000 + Search.CHECK_EVERY + 1
+
+def test_search_result_statistics_and_info_callback():
+    board = board_from_fen(KIWIPETE_FEN)
+    searcher = Search.Searcher(1)
+    reports = []
+    result = searcher.search(board, Search.SearchLimits(depth=4),
+                             info=lambda depth, score, pv, nodes: reports.append((depth, score, pv, nodes)))
+
+    assert [report[0] for report in reports] == [1, 2, 3, 4]
+    assert reports[-1][1] == result.score and reports[-1][2] == result.pv
+    assert [report[3] for report in reports] == sorted(report[3] for report in reports)
+
+    assert result.depth == 4 and len(result.iteration_times) == 4
+    assert 0 < result.qnodes < result.nodes
+    assert 0 < result.tt_hits <= result.tt_probes
+    assert 0 < result.first_move_cutoffs <= result.beta_cutoffs
+    assert 0 <= result.null_success_rate <= 1 and 0 <= result.lmr_success_rate <= 1
+    assert result.nps > 0
+
+def test_mate_scores_count_plies_from_the_root():
+    # back rank: Ra8# is mate in one ply
+    board = board_from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    result = Search.Searcher(1).search(board, Search.SearchLimits(depth=6))
+    assert board.move_to_string(result.best_move) == "a1a8"
+    assert result.score == MATE_SCORE - 1
+    assert result.depth == 1  # a proven mate ends iterative deepening
+
+    # the side getting mated sees the same distance with the sign flipped
+    board = board_from_fen("R5k1/5ppp/8/8/8/8/8/6K1 b - - 0 1")
+    assert Search.Searcher(1).search(board, Search.SearchLimits(depth=3)).score == -MATE_SCORE
+
+def test_mate_in_two_stops_at_depth_three():
+    # Kb6 leaves black only Kb8, then Rh8 mates
+    board = board_from_fen("k7/8/2K5/8/8/8/8/7R w - - 0 1")
+    result = Search.Searcher(1).search(board, Search.SearchLimits(depth=8))
+    assert result.score == MATE_SCORE - 3
+    assert result.depth == 3
+    assert board.move_to_string(result.pv[-1]) == "h1h8"
+
+def test_stalemate_and_repetition_score_as_draws():
+    board = board_from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    assert Search.Searcher(1).search(board, Search.SearchLimits(depth=3)).score == DRAW_SCORE
+
+    board = Board()
+    board.setup_starting_position()
+    for uci in ("g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1"):
+        board.make_move(next(m for m in board.generate_legal_moves() if board.move_to_string(m) == uci))
+    # Ng8 repeats the starting position: a draw inside the tree whatever the evaluation says
+    board.make_move(next(m for m in board.generate_legal_moves() if board.move_to_string(m) == "f6g8"))
+    assert Search.Searcher(1).negamax(board, 3, -INFINITE, INFINITE) == DRAW_SCORE
+
+def test_mate_scores_are_stored_relative_to_the_node():
+    mate_at_root = MATE_SCORE - 7
+    stored = Search.score_to_tt(mate_at_root, 3)
+    assert stored == MATE_SCORE - 4
+    # probed again two plies closer to the root the mate is two plies nearer
+    assert Search.score_from_tt(stored, 1) == MATE_SCORE - 5
+    assert Search.score_from_tt(Search.score_to_tt(-mate_at_root, 3), 3) == -mate_at_root
+    assert Search.score_to_tt(250, 10) == 250
+    assert MATE_SCORE - Search.score_to_tt(MATE_SCORE - 1, 200) < MATE_SCORE - MATE_BOUND
@@ -0,0 +1,65 @@
+import pytest
+from transposition import TranspositionTable, table_bytes, EXACT, LOWER, UPPER
+
+
+def test_store_and_probe_round_trip():
+    tt = TranspositionTable(1)
+    key = 0x123456789ABCDEF0
+    tt.store(key, 1234, 5, -321, LOWER)
+    assert tt.probe(key) == (1234, 5, -321, LOWER)
+    assert tt.probe(key ^ 1) is None
+
+def test_depth_preferred_slot_keeps_deeper_entry():
+    tt = TranspositionTable(1)
+    buckets = tt.bucket_mask + 1
+    deep, shallow, newer = 7, 7 + buckets, 7 + 2 * buckets  # same bucket, different keys
+
+    tt.store(deep, 1, 8, 10, EXACT)
+    tt.store(shallow, 2, 2, 20, UPPER)
+    assert tt.probe(deep) == (1, 8, 10, EXACT)
+    assert tt.probe(shallow) == (2, 2, 20, UPPER)
+
+    # always-replace slot takes the next shallow entry
+    tt.store(newer, 3, 1, 30, EXACT)
+    assert tt.probe(deep) is not None
+    assert tt.probe(shallow) is None
+    assert tt.probe(newer) == (3, 1, 30, EXACT)
+
+def test_old_generation_entries_are_replaced():
+    tt = TranspositionTable(1)
+    buckets = tt.bucket_mask + 1
+    tt.store(5, 1, 9, 0, EXACT)
+    tt.new_search()
+    tt.store(5 + buckets, 2, 1, 0, EXACT)
+    assert tt.probe(5 + buckets) == (2, 1, 0, EXACT)
+    slot = (5 & tt.bucket_mask) << 1
+    assert tt.keys[slot] ^ tt.data[slot] == 5 + buckets
+
+def test_store_without_move_keeps_previous_move():
+    tt = TranspositionTable(1)
+    tt.store(99, 777, 3, 5, LOWER)
+    tt.store(99, 0, 4, 6, UPPER)
+    assert tt.probe(99) == (777, 4, 6, UPPER)
+
+def test_hashfull_counts_current_generation():
+    tt = TranspositionTable(1)
+    assert tt.hashfull() == 0
+    buckets = tt.bucket_mask + 1
+    for key in range(buckets):
+        tt.store(key, 1, 2, 0, EXACT)            # depth-preferred slots
+        tt.store(key + buckets, 1, 1, 0, EXACT)  # always-replace slots
+    assert tt.hashfull() == 1000
+    tt.new_search()
+    assert tt.hashfull() == 0
+
+def test_table_in_external_buffer_rejects_torn_entries():
+    buffer = bytearray(table_bytes(1))
+    tt = TranspositionTable(1, buffer)
+    tt.store(42, 1234, 6, 15, EXACT)
+    assert tt.probe(42) == (1234, 6, 15, EXACT)
+    assert TranspositionTable(1, buffer).probe(42) == (1234, 6, 15, EXACT)  # a second view sees it
+
+    slot = (42 & tt.bucket_mask) << 1
+    tt.data[slot] ^= 1 << 40  # data half written by another process, key half not
+    assert tt.probe(42) is None
+    tt.release()
@@ -0,0 +1,23 @@
+# time budgets for one engine move, all values in seconds
+
+MOVE_OVERHEAD = 0.05   # kept back for GUI latency on every move
+MIN_MOVES_TO_GO = 20   # assume at least this many moves are still to be played
+MAX_MOVES_TO_GO = 40
+HARD_LIMIT_FACTOR = 3  # a single move may overrun its soft budget by this much
+MAX_TIME_SHARE = 0.3   # never spend more than this share of the remaining clock
+MIN_BUDGET = 0.01
+
+def moves_to_go(move_number):
+    # expect long games early on and fewer remaining moves as the game goes on
+    return max(MIN_MOVES_TO_GO, MAX_MOVES_TO_GO - move_number // 2)
+
+def allocate_time(remaining, increment=0, move_number=1):
+    """Return (soft, hard) limits. The search should not start a new
+    iteration past the soft limit and must stop at the hard limit"""
+    available = max(MIN_BUDGET, remaining - MOVE_OVERHEAD)
+
+    soft = available / moves_to_go(move_number) + increment * 0.75
+    hard = min(soft * HARD_LIMIT_FACTOR, available * MAX_TIME_SHARE)
+    soft = min(soft, hard)
+
+    return max(MIN_BUDGET, soft), max(MIN_BUDGET, hard)
@@ -0,0 +1,101 @@
+from array import array
+
+# bound types
+EXACT = 0
+LOWER = 1 # score is at least this (failed high)
+UPPER = 2 # score is at most this (failed low)
+
+# each slot is two unsigned 64-bit words: the zobrist key XOR the packed data, and the packed data.
+# A slot written by two processes at once no longer XORs back to its key, so a
+# table shared between processes needs no locks: torn entries just miss
+#   bits  0-15  best move
+#   bits 16-23  depth
+#   bits 24-25  bound
+#   bits 26-31  generation
+#   bits 32-63  score + SCORE_OFFSET
+SLOT_BYTES = 16
+SLOTS_PER_BUCKET = 2 # slot 0 is depth-preferred, slot 1 is always-replace
+SCORE_OFFSET = 1 << 31
+GENERATION_MASK = 0x3F
+
+HASHFULL_SAMPLE = 1000
+
+def table_bytes(size_mb):
+    """Size of the buffer a table of size_mb uses, rounded down to a power of two buckets"""
+    buckets = max(1, (size_mb * 1024 * 1024) // (SLOT_BYTES * SLOTS_PER_BUCKET))
+    return (1 << (buckets.bit_length() - 1)) * SLOTS_PER_BUCKET * SLOT_BYTES
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, buffer=None):
+        """buffer, if given, is at least table_bytes(size_mb) of zeroed memory
+        (e.g. a multiprocessing.shared_memory block) to keep the table in"""
+        self.slot_count = table_bytes(size_mb) // SLOT_BYTES
+        self.bucket_mask = self.slot_count // SLOTS_PER_BUCKET - 1
+
+        if buffer is None:
+            self.keys = array('Q', [0]) * self.slot_count
+            self.data = array('Q', [0]) * self.slot_count
+        else:
+            self.words = memoryview(buffer).cast('B')[:self.slot_count * SLOT_BYTES].cast('Q')
+            self.keys = self.words[:self.slot_count]
+            self.data = self.words[self.slot_count:]
+        self.generation = 0
+
+    def release(self):
+        # let go of an external buffer so its owner can close it
+        if isinstance(self.keys, memoryview):
+            self.keys.release()
+            self.data.release()
+            self.words.release()
+
+    def new_search(self):
+        # entries from older searches become the first to be replaced
+        self.generation = (self.generation + 1) & GENERATION_MASK
+
+    def clear(self):
+        # in place, the arrays may live in shared memory
+        zeros = array('Q', [0]) * self.slot_count
+        self.keys[:] = zeros
+        self.data[:] = zeros
+        self.generation = 0
+
+    def probe(self, key):
+        """Return (move, depth, score, bound) for key, or None"""
+        slot = (key & self.bucket_mask) << 1
+        keys = self.keys
+        data = self.data[slot]
+        if keys[slot] ^ data != key:
+            data = self.data[slot + 1]
+            if keys[slot + 1] ^ data != key:
+                return None
+        if not data:
+            return None
+        return (data & 0xFFFF, (data >> 16) & 0xFF, (data >> 32) - SCORE_OFFSET, (data >> 24) & 0x3)
+
+    def store(self, key, move, depth, score, bound):
+        slot = (key & self.bucket_mask) << 1
+        keys = self.keys
+        data = self.data
+
+        # depth-preferred slot unless it holds a deeper entry from this search
+        old = data[slot]
+        if (old and keys[slot] ^ old != key and (old >> 26) & GENERATION_MASK == self.generation and
+                (old >> 16) & 0xFF > depth):
+            slot += 1 # always-replace slot
+
+        old = data[slot]
+        if not move and keys[slot] ^ old == key:
+            move = old & 0xFFFF # keep the best move we already had
+
+        new = (move | (depth << 16) | (bound << 24) | (self.generation << 26) |
+               ((score + SCORE_OFFSET) << 32))
+        keys[slot] = key ^ new
+        data[slot] = new
+
+    def hashfull(self):
+        """Permille of sampled slots filled during the current search"""
+        data = self.data
+        sample = min(HASHFULL_SAMPLE, self.slot_count)
+        used = sum(1 for i in range(sample)
+                   if data[i] and (data[i] >> 26) & GENERATION_MASK == self.generation)
+        return used * 1000 // sample
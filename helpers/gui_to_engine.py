@@ -25,6 +25,8 @@ def convert_gui_to_engine(gui_board, engine_board, turn):
 
     # Sync turn
     engine_board.turn = 1 if turn == 'w' else -1
+    # Rebuild bitboards, king squares and hash from the new squares
+    engine_board.sync_from_squares()
     # Sync castling rights and en passant if needed
     engine_board.castling_rights = gui_board._castling_rights
     engine_board.en_passant_target = (
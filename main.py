@@ -1,7 +1,9 @@
 from helpers.gui_to_engine import convert_gui_to_engine, convert_engine_move_to_gui
 from renderer import render_board, render_gameover, render_clock
 from helpers.input import detect_promotion_click
-from engine.Search import search_best_move
+from engine.Search import Searcher, SearchLimits
+from engine.timeman import allocate_time
+from engine.ponder import Ponderer
 from helpers.setup import setup_from_fen
 from gamestate import GameState
 from game.board import Board
@@ -12,10 +14,32 @@ import pygame
 import sys
 
 engine_thinking = False
+searcher = Searcher() # keeps its hash table and history for the whole game
+ponderer = Ponderer(searcher) # searches on the player's time, see engine/ponder.py
+
+def start_pondering(engine_board, best_move):
+    if cfg.PONDER:
+        ponderer.start(engine_board, best_move)
+
+def finish_pondering(engine_board, time_limit):
+    """On a ponder hit the running search goes on under the real clock and its
+    result is returned; on a miss it is stopped and (None, None) returned."""
+    return ponderer.finish(engine_board, time_limit)
+
+def stop_pondering():
+    # nothing to play after game over or a reset, the search would only eat CPU
+    ponderer.stop()
+
 def engine_play(board, gamestate, engine_board):
     global engine_thinking
     convert_gui_to_engine(board, engine_board, gamestate.turn)
-    best_move, score = search_best_move(engine_board, depth=3)
+    clock = gamestate.clock
+    time_limit = allocate_time(clock.get_time(gamestate.turn), clock.increment, gamestate.fullmove_number)
+
+    best_move, score = finish_pondering(engine_board, time_limit)
+    if best_move is None:
+        result = searcher.search(engine_board, SearchLimits(time_limit=time_limit))
+        best_move, score = result.best_move, result.score
     start, end = convert_engine_move_to_gui(best_move)
 
     moving_piece = board.piece_at(*start)
@@ -27,6 +51,7 @@ def engine_play(board, gamestate, engine_board):
     gamestate.clock.switch_turn()
 
     board.flag_for_redraw()
+    start_pondering(engine_board, best_move)
     engine_thinking = False
 
 
@@ -67,6 +92,7 @@ def main():
                     board.flag_for_redraw()
 
                 if event.key == pygame.K_r:
+                    stop_pondering()
                     setup_from_fen(cfg.START_FEN, board, gamestate, cfg.SQUARE_SIZE)
 
                 if event.key == pygame.K_LEFT:
@@ -107,6 +133,7 @@ def main():
             board.needs_rendered = False
 
         if gamestate.status['is_gameover']:
+            stop_pondering() # does nothing once stopped
             render_gameover(window, board, gamestate)
 
         current_time = pygame.time.get_ticks()